@@ -1,13 +1,34 @@
 import os
 import time
+import uuid
 import streamlit as st
-import base64
 import logging
 from pathlib import Path
 
-from content_extractor import extract_content
+from cache_warmer import get_warming_stats, record_user_request, start_cache_warmer
+from content_extractor import (
+    extract_content,
+    get_youtube_collection_videos,
+    is_youtube_collection_url,
+    iter_youtube_collection_content,
+)
 from summarizer import generate_audio_summary, generate_summary
-from audio_generator import generate_audio
+from audio_generator import (
+    AUDIO_FORMATS,
+    DEFAULT_AUDIO_SETTINGS,
+    TTS_VOICES,
+    audio_settings_key,
+    generate_audio,
+    get_audio_mime_type,
+)
+from cpu_pool import get_cpu_pool_stats, warm_cpu_pool
+from dedup_index import content_signature, find_duplicate, get_dedup_stats, remember_audio, remember_summary
+from deadlines import HEDGING_ENABLED, REQUEST_DEADLINE_SECONDS, Deadline, get_hedging_stats
+from model_router import get_model_stats
+from output_budgets import get_output_budget_stats
+from profiling import profile_request, should_profile
+from session_store import read_audio, session_store
+from speech_pipeline import generate_summary_with_audio
 from streamlit.components.v1 import html
 
 # Configure logging
@@ -27,6 +48,14 @@ AUDIO_DIR = "audio_files"
 Path(AUDIO_DIR).mkdir(parents=True, exist_ok=True)
 logger.info(f"Created/verified audio directory: {AUDIO_DIR}")
 
+# Playlist/channel ingestion limits
+MAX_PLAYLIST_VIDEOS = int(os.getenv("MAX_PLAYLIST_VIDEOS", "100"))
+PLAYLIST_FETCH_WORKERS = int(os.getenv("PLAYLIST_FETCH_WORKERS", "8"))
+PLAYLIST_DEADLINE_SECONDS = float(os.getenv("PLAYLIST_DEADLINE_SECONDS", "1800"))
+
+# Stored session payloads are dropped after this long without activity
+SESSION_MAX_AGE_MINUTES = int(os.getenv("SESSION_MAX_AGE_MINUTES", "60"))
+
 # Custom CSS styles
 st.markdown(
     """
@@ -67,19 +96,37 @@ st.markdown(
 )
 
 
-def get_audio_file_link(file_path):
-    """Generate a download link for the audio file"""
-    logger.info(f"Generating download link for audio file: {file_path}")
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
+def store_session_payload(name, value):
+    """Keep a large payload in the session store and only its handle in session state"""
+    st.session_state[name] = session_store.replace(
+        st.session_state.session_id, st.session_state.get(name), value
+    )
 
-    b64_audio = base64.b64encode(audio_bytes).decode()
-    filename = os.path.basename(file_path)
 
-    href = (
-        f'<a href="data:audio/mp3;base64,{b64_audio}" download="{filename}">Download Audio File</a>'
-    )
-    return href
+def load_session_payload(name):
+    """Load a payload stored with store_session_payload"""
+    return session_store.get(st.session_state.get(name))
+
+
+def format_bytes(size):
+    """Human readable byte count"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def render_playlist_result(result, summary_type):
+    """Render the summary (or error) for one video of a playlist"""
+    with st.expander(result["title"], expanded=False):
+        st.markdown(f"[Watch on YouTube]({result['url']})")
+        if "error" in result:
+            st.warning(result["error"])
+        else:
+            st.markdown(f"**Published Date:** {result['publish_date']}")
+            st.markdown(f'<div class="sub-header">Summary ({summary_type})</div>', unsafe_allow_html=True)
+            st.markdown(result["summary"])
 
 
 def main():
@@ -93,7 +140,12 @@ def main():
     logger.info(f"Audio files directory: {audio_files_dir}")
 
     current_time = time.time()
-    for file_path in Path(root_dir / AUDIO_DIR).glob("*.mp3"):
+    audio_files = [
+        file_path
+        for audio_format in AUDIO_FORMATS.values()
+        for file_path in Path(root_dir / AUDIO_DIR).glob(f"*.{audio_format['extension']}")
+    ]
+    for file_path in audio_files:
         file_creation_time = os.path.getctime(file_path)
         file_age_minutes = (current_time - file_creation_time) / 60
 
@@ -105,6 +157,10 @@ def main():
             except Exception as e:
                 logger.error(f"Error deleting old audio file {file_path}: {str(e)}")
 
+    session_store.expire(SESSION_MAX_AGE_MINUTES * 60)
+    warm_cpu_pool()
+    start_cache_warmer()
+
     st.markdown(
         '<div class="main-header">Smart Content Summary & Audio Generator</div>',
         unsafe_allow_html=True,
@@ -114,7 +170,57 @@ def main():
     )
     st.markdown("Only videos with captions available in English are allowed to be processed.")
 
-    # Initialize session state
+    dedup_stats = get_dedup_stats()
+    st.sidebar.markdown("### Summary Cache")
+    st.sidebar.caption(
+        f"Near-duplicate hit rate: {dedup_stats['hit_rate']:.0%} "
+        f"({dedup_stats['hits']}/{dedup_stats['lookups']} lookups, "
+        f"{dedup_stats['documents']} documents, threshold {dedup_stats['threshold']:.2f}; "
+        f"{dedup_stats['refreshes']} changed pages re-summarized)"
+    )
+
+    warming_stats = get_warming_stats()
+    if warming_stats["enabled"]:
+        st.sidebar.caption(
+            f"Cache warming: {warming_stats['summary_hits']} of {warming_stats['user_requests']} requests "
+            f"served from warmed summaries ({warming_stats['audio_hits']} with audio); "
+            f"{warming_stats['summaries_generated']} summaries warmed for {warming_stats['urls_warmed']} URLs"
+        )
+
+    model_stats = get_model_stats()
+    if model_stats:
+        st.sidebar.markdown("### Models")
+        for model, stats in model_stats.items():
+            for task, task_stats in stats["tasks"].items():
+                p95 = f"{task_stats['p95_latency']:.1f}s" if task_stats["p95_latency"] is not None else "n/a"
+                status = "healthy" if task_stats["healthy"] else "failing over"
+                st.sidebar.caption(
+                    f"{model} ({task}): p95 {p95} (threshold {task_stats['threshold']:g}s), "
+                    f"{task_stats['error_rate']:.0%} errors over {task_stats['calls']} calls ({status})"
+                )
+        if HEDGING_ENABLED:
+            hedging_stats = get_hedging_stats()
+            st.sidebar.caption(
+                f"Hedged {hedging_stats['hedges']} of {hedging_stats['calls']} calls "
+                f"({hedging_stats['hedge_rate']:.0%}), {hedging_stats['hedge_wins']} hedges finished first"
+            )
+
+    output_budget_stats = get_output_budget_stats()
+    if output_budget_stats:
+        st.sidebar.markdown("### Output Budgets")
+        for summary_type, stats in output_budget_stats.items():
+            st.sidebar.caption(
+                f"{summary_type}: {stats['budget']}/{stats['configured_budget']} tokens, "
+                f"p95 {stats['p95_latency']:.1f}s (SLO {stats['slo_seconds']:g}s), "
+                f"p50 {stats['p50_completion_tokens']} tokens, "
+                f"{stats['truncated']} of {stats['samples']} cut off at the budget"
+            )
+
+    # Initialize session state. Large payloads (summaries, playlist results)
+    # live in the session store; session state only holds their handles.
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        logger.info("Initialized session_id in session state")
     if "content_data" not in st.session_state:
         st.session_state.content_data = None
         logger.info("Initialized content_data in session state")
@@ -130,6 +236,34 @@ def main():
     if "processing_type" not in st.session_state:
         st.session_state.processing_type = None
         logger.info("Initialized processing_type in session state")
+    if "dedup_doc_id" not in st.session_state:
+        st.session_state.dedup_doc_id = None
+        st.session_state.reused_audio = None
+        logger.info("Initialized dedup state in session state")
+    if "playlist_results" not in st.session_state:
+        st.session_state.playlist_results = None
+        logger.info("Initialized playlist_results in session state")
+    if "profile_request" not in st.session_state:
+        st.session_state.profile_request = False
+
+    session_footprint = session_store.footprint(st.session_state.session_id)
+    process_footprint = session_store.footprint()
+    st.sidebar.markdown("### Session Storage")
+    st.sidebar.caption(
+        f"This session: {format_bytes(session_footprint['memory_bytes'])} in memory, "
+        f"{format_bytes(session_footprint['disk_bytes'])} on disk. "
+        f"All sessions: {format_bytes(process_footprint['memory_bytes'])} of "
+        f"{format_bytes(session_store.memory_budget)} memory budget, "
+        f"{format_bytes(process_footprint['disk_bytes'])} on disk."
+    )
+
+    cpu_pool_stats = get_cpu_pool_stats()
+    if cpu_pool_stats["workers"]:
+        st.sidebar.markdown("### Parsing")
+        st.sidebar.caption(
+            f"Parsing: {cpu_pool_stats['offloaded']} stages in {cpu_pool_stats['workers']} worker processes "
+            f"(avg {cpu_pool_stats['avg_ms']:.0f} ms), {cpu_pool_stats['inline']} small inputs in-process"
+        )
 
     with st.form("content_form"):
         url = st.text_input(
@@ -150,6 +284,47 @@ def main():
             disabled=st.session_state.is_processing,
         )
 
+        with st.expander("Audio settings"):
+            audio_voice = st.selectbox(
+                "Voice",
+                options=TTS_VOICES,
+                index=TTS_VOICES.index(DEFAULT_AUDIO_SETTINGS["voice"]),
+                disabled=st.session_state.is_processing,
+            )
+            audio_format = st.selectbox(
+                "Format",
+                options=list(AUDIO_FORMATS),
+                index=list(AUDIO_FORMATS).index(DEFAULT_AUDIO_SETTINGS["format"]),
+                help="Opus and AAC are much smaller than MP3 for speech",
+                disabled=st.session_state.is_processing,
+            )
+            audio_speed = st.slider(
+                "Speed",
+                min_value=0.5,
+                max_value=2.0,
+                value=DEFAULT_AUDIO_SETTINGS["speed"],
+                step=0.25,
+                disabled=st.session_state.is_processing,
+            )
+            bitrate_options = [None, 24, 32, 48, 64, 96]
+            audio_bitrate = st.selectbox(
+                "Bitrate (kbps)",
+                options=bitrate_options,
+                index=bitrate_options.index(DEFAULT_AUDIO_SETTINGS["bitrate"])
+                if DEFAULT_AUDIO_SETTINGS["bitrate"] in bitrate_options
+                else 0,
+                format_func=lambda bitrate: f"{bitrate} kbps" if bitrate else "Default",
+                help="Re-encodes the audio with ffmpeg when set",
+                disabled=st.session_state.is_processing,
+            )
+
+        audio_settings = {
+            "voice": audio_voice,
+            "format": audio_format,
+            "speed": audio_speed,
+            "bitrate": audio_bitrate,
+        }
+
         summary_type_map = {
             "Quick Takeaways": "quick",
             "Deep Dive": "deep_dive",
@@ -163,14 +338,28 @@ def main():
             if url:
                 logger.info(f"Form submitted with URL: {url} and summary type: {summary_type}")
                 st.session_state.is_processing = True
-                st.session_state.processing_type = "summary"
+                st.session_state.profile_request = should_profile(st.experimental_get_query_params())
+                if is_youtube_collection_url(url):
+                    st.session_state.deadline = Deadline(PLAYLIST_DEADLINE_SECONDS)
+                    st.session_state.processing_type = "playlist"
+                    st.session_state.content_data = None
+                    store_session_payload("summary_data", None)
+                    st.session_state.audio_data = None
+                else:
+                    # One deadline covers extraction, summary and audio across reruns
+                    st.session_state.deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+                    st.session_state.processing_type = "summary"
+                    store_session_payload("playlist_results", None)
                 st.rerun()
 
     if st.session_state.is_processing:
         if st.session_state.processing_type == "summary":
             logger.info("Starting content extraction and summary generation")
-            with st.spinner("Processing..."):
-                content_data = extract_content(url)
+            with st.spinner("Processing..."), profile_request(
+                url, st.session_state.profile_request, "summary"
+            ) as profile:
+                with profile.stage("extraction"):
+                    content_data = extract_content(url, deadline=st.session_state.deadline)
                 logger.info(
                     f"Content extraction completed. Title: {content_data.get('title', 'N/A')}"
                 )
@@ -188,18 +377,69 @@ def main():
                         st.session_state.is_processing = True
                         st.session_state.processing_type = None
                         st.session_state.content_data = None
-                        st.session_state.summary_data = None
-                        st.session_state.audio_summary = None
+                        store_session_payload("summary_data", None)
                         st.experimental_rerun()  # Rerun the app to start the process again
                 else:
-                    st.session_state.content_data = content_data
-                    logger.info("Starting summary generation")
-                    summary_data = generate_summary(
-                        content_data["content"],
-                        content_data["title"],
-                        content_data["publish_date"],
-                        summary_type_map[summary_type],
-                    )
+                    # Only the metadata stays in the session, the full text is not needed after summarization
+                    st.session_state.content_data = {
+                        key: content_data[key]
+                        for key in ("title", "publish_date", "source_type", "canonical_url")
+                    }
+                    section_hashes = [section["hash"] for section in content_data["sections"]]
+                    with profile.stage("dedup"):
+                        signature = content_signature(content_data["content"])
+                        duplicate = find_duplicate(
+                            signature,
+                            summary_type_map[summary_type],
+                            audio_key=f"{summary_type_map[summary_type]}:{audio_settings_key(audio_settings)}",
+                            canonical_url=content_data["canonical_url"],
+                            section_hashes=section_hashes,
+                        )
+                    record_user_request(url, summary_type_map[summary_type], duplicate)
+
+                    audio_data = None
+                    if duplicate:
+                        summary_data = duplicate["summary_data"]
+                        st.session_state.dedup_doc_id = duplicate["doc_id"]
+                        st.session_state.reused_audio = duplicate["audio_data"]
+                    else:
+                        # Speech is synthesized sentence by sentence while the summary streams in
+                        logger.info("Starting summary and audio generation")
+                        summary_preview = st.empty()
+                        streamed_text = []
+
+                        def show_streamed_text(text):
+                            streamed_text.append(text)
+                            summary_preview.markdown("".join(streamed_text))
+
+                        with profile.stage("summary_and_audio"):
+                            summary_data, audio_data = generate_summary_with_audio(
+                                content_data["content"],
+                                content_data["title"],
+                                content_data["publish_date"],
+                                summary_type_map[summary_type],
+                                output_dir=AUDIO_DIR,
+                                sections=content_data.get("sections"),
+                                settings=audio_settings,
+                                deadline=st.session_state.deadline,
+                                on_text=show_streamed_text,
+                            )
+                        summary_preview.empty()
+                        st.session_state.reused_audio = None
+                        if "error" not in summary_data:
+                            st.session_state.dedup_doc_id = remember_summary(
+                                signature,
+                                summary_type_map[summary_type],
+                                summary_data,
+                                canonical_url=content_data["canonical_url"],
+                                section_hashes=section_hashes,
+                            )
+                        if audio_data and "error" not in audio_data:
+                            remember_audio(
+                                st.session_state.dedup_doc_id,
+                                f"{summary_type_map[summary_type]}:{audio_settings_key(audio_settings)}",
+                                audio_data,
+                            )
 
                     if "error" in summary_data:
                         error_msg = f"Error in summary generation: {summary_data['error']}"
@@ -214,29 +454,109 @@ def main():
                             st.session_state.is_processing = True
                             st.session_state.processing_type = None
                             st.session_state.content_data = None
-                            st.session_state.summary_data = None
-                            st.session_state.audio_summary = None
+                            store_session_payload("summary_data", None)
                             st.experimental_rerun()  # Rerun the app to start the process again
                     else:
-                        st.session_state.summary_data = summary_data
+                        store_session_payload("summary_data", summary_data)
                         logger.info("Summary generation completed successfully")
-                        st.session_state.processing_type = "audio"
+                        if audio_data:
+                            # Audio was produced alongside the summary
+                            st.session_state.audio_data = audio_data
+                            st.session_state.is_processing = False
+                            st.session_state.processing_type = None
+                        else:
+                            st.session_state.processing_type = "audio"
                         st.rerun()
 
+        elif st.session_state.processing_type == "playlist":
+            logger.info("Starting playlist extraction and summary generation")
+            with st.spinner("Listing videos..."):
+                videos_data = get_youtube_collection_videos(url, max_videos=MAX_PLAYLIST_VIDEOS)
+            deadline = st.session_state.deadline
+
+            if "error" in videos_data:
+                error_msg = f"Error in playlist extraction: {videos_data['error']}"
+                logger.error(error_msg)
+                st.error(error_msg)
+                st.session_state.is_processing = False
+                st.session_state.processing_type = None
+            else:
+                videos = videos_data["videos"]
+                logger.info(f"Found {len(videos)} videos to summarize")
+                progress = st.progress(0.0, text=f"Summarizing {len(videos)} videos...")
+                results = []
+
+                # Transcripts are fetched concurrently and summarized as each one arrives
+                for video_content in iter_youtube_collection_content(
+                    videos, max_workers=PLAYLIST_FETCH_WORKERS, deadline=deadline
+                ):
+                    result = {
+                        "title": video_content["title"],
+                        "url": video_content["url"],
+                    }
+                    if "error" in video_content:
+                        result["error"] = video_content["error"]
+                    else:
+                        summary_data = generate_summary(
+                            video_content["content"],
+                            video_content["title"],
+                            video_content["publish_date"],
+                            summary_type_map[summary_type],
+                            deadline=deadline,
+                        )
+                        if "error" in summary_data:
+                            result["error"] = summary_data["error"]
+                        else:
+                            result["summary"] = summary_data["summary"]
+                            result["publish_date"] = video_content["publish_date"]
+
+                    results.append(result)
+                    render_playlist_result(result, summary_type)
+                    progress.progress(
+                        len(results) / len(videos),
+                        text=f"Summarized {len(results)} of {len(videos)} videos",
+                    )
+                    if deadline.expired():
+                        break
+
+                store_session_payload(
+                    "playlist_results", {"total": len(videos), "results": results}
+                )
+                logger.info("Playlist summary generation completed")
+                st.session_state.is_processing = False
+                st.session_state.processing_type = None
+                st.rerun()
+
         elif st.session_state.processing_type == "audio":
             if st.session_state.content_data and st.session_state.summary_data:
                 logger.info("Starting audio generation")
-                with st.spinner("Generating audio..."):
+                with st.spinner("Generating audio..."), profile_request(
+                    url, st.session_state.profile_request, "audio"
+                ) as profile:
                     logger.info("Using original summary for audio generation")
-                    audio_summary = st.session_state.summary_data["summary"]
-
-                    st.session_state.audio_summary = audio_summary
-
-                    audio_data = generate_audio(
-                        text=audio_summary,
-                        title=st.session_state.content_data["title"],
-                        output_dir=AUDIO_DIR,
-                    )
+                    summary_data = load_session_payload("summary_data")
+
+                    if summary_data is None:
+                        # The session's payloads were expired or removed
+                        audio_data = {"error": "The summary is no longer available, please generate it again"}
+                    elif st.session_state.reused_audio:
+                        logger.info("Reusing audio of near-duplicate document")
+                        audio_data = st.session_state.reused_audio
+                    else:
+                        with profile.stage("audio"):
+                            audio_data = generate_audio(
+                                text=summary_data["summary"],
+                                title=st.session_state.content_data["title"],
+                                output_dir=AUDIO_DIR,
+                                settings=audio_settings,
+                                deadline=st.session_state.deadline,
+                            )
+                        if "error" not in audio_data and st.session_state.dedup_doc_id is not None:
+                            remember_audio(
+                                st.session_state.dedup_doc_id,
+                                f"{summary_type_map[summary_type]}:{audio_settings_key(audio_settings)}",
+                                audio_data,
+                            )
                     st.session_state.audio_data = audio_data
                     logger.info(
                         f"Audio generation completed. File path: {audio_data.get('audio_path', 'N/A')}"
@@ -247,6 +567,13 @@ def main():
 
                 st.rerun()
 
+    if (
+        st.session_state.audio_data
+        and "error" in st.session_state.audio_data
+        and not st.session_state.is_processing
+    ):
+        st.error(f"Error in audio generation: {st.session_state.audio_data['error']}")
+
     if (
         st.session_state.content_data
         and st.session_state.summary_data
@@ -254,11 +581,12 @@ def main():
     ):
         logger.info("Displaying results")
         content_data = st.session_state.content_data
-        summary_data = st.session_state.summary_data
+        summary_data = load_session_payload("summary_data")
         audio_data = st.session_state.audio_data
 
         if (
-            "error" not in content_data
+            summary_data
+            and "error" not in content_data
             and "error" not in summary_data
             and "error" not in audio_data
         ):
@@ -283,13 +611,19 @@ def main():
                 logger.info(f"Audio generation note: {audio_data['note']}")
                 st.info(audio_data["note"])
 
-            audio_file = open(audio_data["audio_path"], "rb")
-            audio_bytes = audio_file.read()
-            st.audio(audio_bytes, format="audio/mp3")
-
-            st.markdown(get_audio_file_link(audio_data["audio_path"]), unsafe_allow_html=True)
+            # Player and download share one read of the file
+            audio_bytes = read_audio(audio_data["audio_path"])
+            mime_type = audio_data.get("mime_type", get_audio_mime_type("mp3"))
+            st.audio(audio_bytes, format=mime_type)
+            st.download_button(
+                "Download Audio File",
+                data=audio_bytes,
+                file_name=os.path.basename(audio_data["audio_path"]),
+                mime=mime_type,
+            )
+            del audio_bytes
 
-            copy_button_javascript = f"""<button id='copy-button' style='margin-top: 10px;'>Copy Summary to Clipboard</button><script>document.getElementById('copy-button').onclick = function() {{let summaryText = `{st.session_state.audio_summary}`;let tempInput = document.createElement('textarea');tempInput.value = summaryText;document.body.appendChild(tempInput);tempInput.select();document.execCommand('copy');document.body.removeChild(tempInput);alert('Summary copied to clipboard!');}}</script>"""
+            copy_button_javascript = f"""<button id='copy-button' style='margin-top: 10px;'>Copy Summary to Clipboard</button><script>document.getElementById('copy-button').onclick = function() {{let summaryText = `{summary_data["summary"]}`;let tempInput = document.createElement('textarea');tempInput.value = summaryText;document.body.appendChild(tempInput);tempInput.select();document.execCommand('copy');document.body.removeChild(tempInput);alert('Summary copied to clipboard!');}}</script>"""
 
             html(copy_button_javascript, height=50, width=200)
 
@@ -304,5 +638,21 @@ def main():
             logger.info("Results displayed successfully")
 
 
+    playlist_data = load_session_payload("playlist_results")
+    if playlist_data and not st.session_state.is_processing:
+        logger.info("Displaying playlist results")
+        results = playlist_data["results"]
+        succeeded = sum(1 for result in results if "error" not in result)
+        st.markdown(f"#### Summarized {succeeded} of {playlist_data['total']} videos")
+        if len(results) < playlist_data["total"]:
+            st.warning(
+                f"Stopped after {len(results)} videos: "
+                f"the {PLAYLIST_DEADLINE_SECONDS:.0f}s time limit was reached."
+            )
+        st.markdown("---")
+        for result in results:
+            render_playlist_result(result, summary_type)
+
+
 if __name__ == "__main__":
     main()
@@ -1,12 +1,19 @@
 import os
 import logging
+import shutil
+import subprocess
 import tempfile
+import time
 from pathlib import Path
 from slugify import slugify
 from dotenv import load_dotenv
 from datetime import datetime
 from openai import OpenAI
 
+from deadlines import request_timeout
+from model_router import ModelRouter, call_upstream
+from text_segmenter import chunk_text
+
 # Load environment variables
 load_dotenv()
 
@@ -21,8 +28,173 @@ except Exception as e:
     logger.error(f"Error initializing OpenAI client: {str(e)}")
     raise
 
+# Output formats supported by the TTS API, with their file extension and MIME type
+AUDIO_FORMATS = {
+    "mp3": {"extension": "mp3", "mime_type": "audio/mpeg", "codec": "libmp3lame"},
+    "opus": {"extension": "opus", "mime_type": "audio/ogg", "codec": "libopus"},
+    "aac": {"extension": "aac", "mime_type": "audio/aac", "codec": "aac"},
+    "flac": {"extension": "flac", "mime_type": "audio/flac", "codec": "flac"},
+}
+# TTS latency is tracked apart from the chat models (which it would otherwise
+# show up among, with no fallback) and per input length, so a short segment's
+# hedge delay is not set by long ones
+TTS_LENGTH_BUCKETS = (400, 800, 1600)
+tts_latency = ModelRouter(latency_thresholds={})
+
+TTS_MODELS = ("tts-1", "tts-1-hd")
+TTS_VOICES = ("alloy", "echo", "fable", "onyx", "nova", "shimmer")
+
+DEFAULT_AUDIO_SETTINGS = {
+    "model": os.getenv("TTS_MODEL", "tts-1"),
+    "voice": os.getenv("TTS_VOICE", "alloy"),
+    "speed": float(os.getenv("TTS_SPEED", "1.0")),
+    "format": os.getenv("TTS_FORMAT", "mp3"),
+    # Target bitrate in kbps, applied by re-encoding with ffmpeg (None keeps the API's output)
+    "bitrate": int(os.getenv("TTS_BITRATE_KBPS")) if os.getenv("TTS_BITRATE_KBPS") else None,
+}
+
+
+def normalize_audio_settings(settings: dict | None = None) -> dict:
+    """Fill in defaults for audio settings and validate them"""
+    settings = {**DEFAULT_AUDIO_SETTINGS, **(settings or {})}
+
+    if settings["model"] not in TTS_MODELS:
+        raise ValueError(f"Invalid TTS model: {settings['model']}")
+    if settings["voice"] not in TTS_VOICES:
+        raise ValueError(f"Invalid TTS voice: {settings['voice']}")
+    if settings["format"] not in AUDIO_FORMATS:
+        raise ValueError(f"Invalid audio format: {settings['format']}")
+    if not 0.25 <= settings["speed"] <= 4.0:
+        raise ValueError(f"Invalid TTS speed: {settings['speed']}")
+    if settings["format"] == "flac":
+        # Lossless output has no bitrate to choose
+        settings["bitrate"] = None
+
+    return settings
+
+
+def audio_settings_key(settings: dict) -> str:
+    """Short tag identifying audio settings, used in file names and cache keys"""
+    settings = normalize_audio_settings(settings)
+    bitrate = f"{settings['bitrate']}k" if settings["bitrate"] else "native"
+    return f"{settings['model']}-{settings['voice']}-{settings['speed']:g}x-{settings['format']}-{bitrate}"
+
+
+def get_audio_mime_type(audio_format: str) -> str:
+    """MIME type for the player and download button"""
+    return AUDIO_FORMATS.get(audio_format, AUDIO_FORMATS["mp3"])["mime_type"]
+
+
+def transcode_audio(input_path: str, output_path: str, audio_format: str, bitrate: int) -> bool:
+    """
+    Re-encode audio to a target bitrate with ffmpeg.
+    Returns False (leaving the input untouched) if ffmpeg is not installed.
+    """
+    if not shutil.which("ffmpeg"):
+        logger.warning("ffmpeg not found, keeping the TTS API's default bitrate")
+        return False
+
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", input_path,
+        "-c:a", AUDIO_FORMATS[audio_format]["codec"], "-b:a", f"{bitrate}k",
+    ]
+    if audio_format == "opus":
+        # Tune the encoder for speech at low bitrates
+        command += ["-application", "voip"]
+    if audio_format == "aac":
+        command += ["-f", "adts"]
+    subprocess.run(command + [output_path], check=True, capture_output=True)
+    return True
+
+
+def tts_stage(text: str) -> str:
+    """Latency bucket of a TTS input by its length (e.g. tts<=800)"""
+    for limit in TTS_LENGTH_BUCKETS:
+        if len(text) <= limit:
+            return f"tts<={limit}"
+    return f"tts>{TTS_LENGTH_BUCKETS[-1]}"
+
+
+def synthesize_speech(text: str, settings: dict | None = None, deadline=None) -> bytes:
+    """
+    Convert text to speech with OpenAI's TTS API and return the encoded audio
+    in the settings' format (at the API's default bitrate).
+    """
+    settings = normalize_audio_settings(settings)
+
+    if deadline:
+        call_client = client.with_options(
+            timeout=request_timeout(deadline, stage="tts"), max_retries=0
+        )
+    else:
+        call_client = client
+
+    stage = tts_stage(text)
+    started = time.monotonic()
+    try:
+        response = call_upstream(
+            settings["model"],
+            lambda: call_client.audio.speech.create(
+                model=settings["model"],
+                voice=settings["voice"],
+                input=text,
+                speed=settings["speed"],
+                response_format=settings["format"],
+            ),
+            deadline=deadline,
+            stage=stage,
+            router=tts_latency,
+        )
+    except Exception:
+        tts_latency.record(settings["model"], stage, time.monotonic() - started, False)
+        raise
+    tts_latency.record(settings["model"], stage, time.monotonic() - started, True)
+
+    return response.content
+
+
+def save_audio(audio_bytes: bytes, title: str, output_dir: str, settings: dict | None = None) -> dict:
+    """
+    Write synthesized audio to output_dir, re-encoding it to the settings'
+    bitrate if one is set, and return the audio result dict.
+    """
+    settings = normalize_audio_settings(settings)
+    audio_format = settings["format"]
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Generate filename from title, settings and timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_title = "".join(
+        c for c in title if c.isalnum() or c in (" ", "-", "_")
+    ).rstrip()
+    extension = AUDIO_FORMATS[audio_format]["extension"]
+    filename = f"{safe_title}_{audio_settings_key(settings)}_{timestamp}.{extension}"
+    output_path = os.path.join(output_dir, filename)
+
+    if settings["bitrate"]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            raw_path = os.path.join(temp_dir, f"raw.{extension}")
+            with open(raw_path, "wb") as f:
+                f.write(audio_bytes)
+            if not transcode_audio(raw_path, output_path, audio_format, settings["bitrate"]):
+                shutil.move(raw_path, output_path)
+    else:
+        # Save the audio file
+        with open(output_path, "wb") as f:
+            f.write(audio_bytes)
+
+    return {
+        "audio_path": output_path,
+        "format": audio_format,
+        "mime_type": get_audio_mime_type(audio_format),
+    }
 
-def generate_audio(text: str, title: str, output_dir: str) -> dict:
+
+def generate_audio(
+    text: str, title: str, output_dir: str, settings: dict | None = None, deadline=None
+) -> dict:
     """
     Generate audio from text using OpenAI's TTS API.
 
@@ -30,31 +202,16 @@ def generate_audio(text: str, title: str, output_dir: str) -> dict:
         text (str): Text to convert to speech
         title (str): Title for the audio file
         output_dir (str): Directory to save the audio file
+        settings (dict, optional): model, voice, speed, format and bitrate
+            (see DEFAULT_AUDIO_SETTINGS)
+        deadline (Deadline, optional): Give up on the TTS call once it passes
 
     Returns:
-        dict: Dictionary containing audio file path and any notes
+        dict: Dictionary containing audio file path, format, MIME type and any notes
     """
     try:
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Generate filename from title and timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_title = "".join(
-            c for c in title if c.isalnum() or c in (" ", "-", "_")
-        ).rstrip()
-        filename = f"{safe_title}_{timestamp}.mp3"
-        output_path = os.path.join(output_dir, filename)
-
-        # Generate audio using OpenAI TTS
-        response = client.audio.speech.create(
-            model="tts-1", voice="alloy", input=text, speed=1.0
-        )
-
-        # Save the audio file
-        response.stream_to_file(output_path)
-
-        return {"audio_path": output_path}
+        audio_bytes = synthesize_speech(text, settings, deadline=deadline)
+        return save_audio(audio_bytes, title, output_dir, settings)
 
     except Exception as e:
         logger.error(f"Error generating audio: {str(e)}")
@@ -64,39 +221,14 @@ def generate_audio(text: str, title: str, output_dir: str) -> dict:
 def chunk_text_for_tts(text, max_chars=4000):
     """
     Split long text into chunks for TTS processing
-    Deepgram has limits on text length for TTS
+    The TTS API has limits on text length per request
     """
-    if len(text) <= max_chars:
-        return [text]
-
-    chunks = []
-    sentences = text.replace("\n", " ").split(". ")
-    current_chunk = ""
-
-    for sentence in sentences:
-        # Add period back if it was removed during split
-        if sentence and not sentence.endswith("."):
-            sentence += "."
-
-        # If adding this sentence would exceed the limit, save the chunk and start a new one
-        if len(current_chunk) + len(sentence) + 1 > max_chars:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = sentence
-        else:
-            if current_chunk:
-                current_chunk += " " + sentence
-            else:
-                current_chunk = sentence
+    return chunk_text(text, max_chars=max_chars)
 
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        chunks.append(current_chunk)
 
-    return chunks
-
-
-def generate_audio_from_long_text(text, title, output_dir="audio_files"):
+def generate_audio_from_long_text(
+    text, title, output_dir="audio_files", settings=None, deadline=None
+):
     """Handle generating audio for longer texts by chunking"""
     if not text:
         return {"error": "No text provided for audio generation"}
@@ -106,15 +238,18 @@ def generate_audio_from_long_text(text, title, output_dir="audio_files"):
 
     if len(chunks) == 1:
         # If only one chunk, use the regular function
-        return generate_audio(text, title, output_dir)
+        return generate_audio(text, title, output_dir, settings=settings, deadline=deadline)
 
     try:
         # Create output directory if it doesn't exist
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+        settings = normalize_audio_settings(settings)
+        extension = AUDIO_FORMATS[settings["format"]]["extension"]
+
         # Create a sanitized filename from the title
         safe_title = slugify(title[:50])
-        filename = f"{safe_title}_{os.urandom(4).hex()}.mp3"
+        filename = f"{safe_title}_{audio_settings_key(settings)}_{os.urandom(4).hex()}.{extension}"
         filepath = os.path.join(output_dir, filename)
 
         # Process chunks and combine them
@@ -123,7 +258,9 @@ def generate_audio_from_long_text(text, title, output_dir="audio_files"):
 
             # Generate audio for each chunk
             for i, chunk in enumerate(chunks):
-                chunk_result = generate_audio(chunk, f"{title}_part_{i+1}", temp_dir)
+                chunk_result = generate_audio(
+                    chunk, f"{title}_part_{i+1}", temp_dir, settings=settings, deadline=deadline
+                )
 
                 if "error" in chunk_result:
                     return chunk_result
@@ -142,6 +279,8 @@ def generate_audio_from_long_text(text, title, output_dir="audio_files"):
                 return {
                     "audio_path": filepath,
                     "filename": filename,
+                    "format": settings["format"],
+                    "mime_type": get_audio_mime_type(settings["format"]),
                     "note": "For long text, this is only a partial audio sample. A complete implementation would combine all audio chunks.",
                 }
             else:
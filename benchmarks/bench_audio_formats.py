@@ -0,0 +1,108 @@
+"""
+Compare TTS output formats and bitrates by size and delivery time.
+
+For every format/bitrate combination the same text is synthesized with
+generate_audio, and the script reports bytes per second of speech, the time
+the TTS call took and the time needed to deliver the file to the browser at
+the given link speed.
+
+Usage:
+    python benchmarks/bench_audio_formats.py [--text-file FILE] [--bandwidth-kbps 2000]
+
+Requires OPENAI_API_KEY (or OPENAI_BASE_URL pointing at a compatible server).
+Bitrate variants and exact durations need ffmpeg/ffprobe on PATH.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_generator import generate_audio  # noqa: E402
+
+SAMPLE_TEXT = (
+    "Here are the key takeaways. First, small daily habits compound into large results over "
+    "time, so consistency matters more than intensity. Second, the environment shapes behavior "
+    "more than motivation does; make good choices easy and bad choices hard. Third, focus on "
+    "systems rather than goals, because goals set direction while systems create progress. "
+    "Finally, identity drives lasting change: decide who you want to be, and prove it to "
+    "yourself with small wins."
+)
+
+VARIANTS = [
+    ("mp3", None),
+    ("mp3", 48),
+    ("aac", None),
+    ("aac", 32),
+    ("opus", None),
+    ("opus", 24),
+    ("opus", 16),
+    ("flac", None),
+]
+
+# Average narration pace used when ffprobe is not available
+WORDS_PER_SECOND = 2.5
+
+
+def audio_duration(path, text, speed):
+    """Duration of the audio in seconds, measured with ffprobe or estimated"""
+    if shutil.which("ffprobe"):
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True,
+            text=True,
+        )
+        try:
+            return float(result.stdout.strip()), "measured"
+        except ValueError:
+            pass
+    return len(text.split()) / (WORDS_PER_SECOND * speed), "estimated"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--text-file", help="Text to synthesize (defaults to a short summary)")
+    parser.add_argument("--bandwidth-kbps", type=float, default=2000, help="Client link speed")
+    parser.add_argument("--voice", default="alloy")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    text = open(args.text_file).read() if args.text_file else SAMPLE_TEXT
+
+    print(f"{'format':<8}{'bitrate':>9}{'bytes':>10}{'speech s':>10}{'B/s':>9}"
+          f"{'tts s':>8}{'deliver s':>11}")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for audio_format, bitrate in VARIANTS:
+            settings = {
+                "voice": args.voice,
+                "speed": args.speed,
+                "format": audio_format,
+                "bitrate": bitrate,
+            }
+            started = time.perf_counter()
+            audio_data = generate_audio(text, "benchmark", output_dir, settings=settings)
+            tts_seconds = time.perf_counter() - started
+
+            if "error" in audio_data:
+                print(f"{audio_format:<8}{bitrate or 'default':>9}  {audio_data['error']}")
+                continue
+
+            size = os.path.getsize(audio_data["audio_path"])
+            duration, source = audio_duration(audio_data["audio_path"], text, args.speed)
+            deliver_seconds = size * 8 / (args.bandwidth_kbps * 1000)
+            marker = "" if source == "measured" else "~"
+
+            print(f"{audio_format:<8}{bitrate or 'default':>9}{size:>10}"
+                  f"{marker + format(duration, '.1f'):>10}{size / duration:>9.0f}"
+                  f"{tts_seconds:>8.2f}{deliver_seconds:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
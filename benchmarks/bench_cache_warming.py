@@ -0,0 +1,100 @@
+"""
+Warm a local article twice against the stub server and check that the second
+run is served entirely from the caches.
+
+Start the stub, e.g.
+
+    python benchmarks/stub_openai_server.py
+
+then run
+
+    python benchmarks/bench_cache_warming.py --summary-types quick,deep_dive
+
+The article is served from a local HTTP server, so no other network access is
+needed. The script exits with an error if the second run makes any model or
+TTS calls.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:8765/v1")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARTICLE = (
+    "<html><head><title>Warming check</title></head><body><article>"
+    + "".join(
+        f"<p>Paragraph {index}: small daily habits compound into large results over time, "
+        "and the environment shapes behavior more than motivation does.</p>"
+        for index in range(40)
+    )
+    + "</article></body></html>"
+).encode("utf-8")
+
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(ARTICLE)))
+        self.end_headers()
+        self.wfile.write(ARTICLE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def count_calls(model_stats, tts_stats):
+    """Total chat model and TTS calls recorded so far"""
+    return sum(stats["calls"] for stats in model_stats.values()) + sum(
+        stats["calls"] for stats in tts_stats.values()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a second warm run makes no calls")
+    parser.add_argument("--summary-types", default="quick,deep_dive")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArticleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/article"
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        seed_path = os.path.join(work_dir, "seeds.jsonl")
+        with open(seed_path, "w") as f:
+            f.write(f'{{"url": "{url}"}}\n')
+        os.environ["WARM_AUDIO_DIR"] = os.path.join(work_dir, "warm")
+        os.environ["WARM_SUMMARY_TYPES"] = args.summary_types
+
+        from audio_generator import tts_latency  # noqa: E402
+        from cache_warmer import CacheWarmer  # noqa: E402
+        from model_router import get_model_stats  # noqa: E402
+
+        warmer = CacheWarmer(access_log_path=os.path.join(work_dir, "access_log.jsonl"), seed_path=seed_path)
+        calls = []
+        for run in (1, 2):
+            before = count_calls(get_model_stats(), tts_latency.stats())
+            started = time.perf_counter()
+            warmer.run_once()
+            calls.append(count_calls(get_model_stats(), tts_latency.stats()) - before)
+            stats = warmer.stats()
+            print(
+                f"run {run}: {time.perf_counter() - started:.2f}s, {calls[-1]} model/TTS calls, "
+                f"{stats['summaries_generated']} summaries and {stats['tokens_spent']} tokens in total"
+            )
+
+    server.shutdown()
+    if calls[1]:
+        sys.exit(f"The second warm run made {calls[1]} calls, expected none")
+    print("The second warm run was served from the caches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Simulate concurrent sessions parsing large article pages, with the parsing in
+the serving process and on the CPU process pool.
+
+    python benchmarks/bench_cpu_pool.py --sessions 8 --page-kb 800 --workers 4
+
+Besides total time, a heartbeat thread stands in for the other sessions served
+by the same process: it wakes every 10 ms, and its lag shows how long they are
+stalled by parsing that holds the GIL. No network access is needed.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_extractor import parse_article_html  # noqa: E402
+from cpu_pool import CpuStageExecutor  # noqa: E402
+from deadlines import percentile  # noqa: E402
+
+
+def make_page(size_kb):
+    """A synthetic article page with navigation, scripts and many paragraphs"""
+    paragraph = (
+        "<p>Small daily habits compound into large results over time, and the "
+        "environment shapes behavior more than motivation does. <a href='#'>More</a></p>\n"
+    )
+    chrome = "<nav><ul>" + "<li><a href='/x'>Link</a></li>" * 50 + "</ul></nav><script>var x = 1;</script>"
+    body = []
+    size = 0
+    while size < size_kb * 1024:
+        body.append(paragraph)
+        size += len(paragraph)
+    return (
+        "<html><head><title>Benchmark article</title>"
+        "<meta property='article:published_time' content='2024-06-01'></head>"
+        f"<body>{chrome}<article>{''.join(body)}</article></body></html>"
+    ).encode("utf-8")
+
+
+def run_sessions(executor, page, sessions):
+    """Parse one page per session concurrently; return (seconds, heartbeat lags in ms)"""
+    lags = []
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.is_set():
+            expected = time.perf_counter() + 0.01
+            time.sleep(0.01)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    beat = threading.Thread(target=heartbeat)
+    beat.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as threads:
+        results = list(
+            threads.map(lambda _: executor.run(parse_article_html, page, "utf-8", size=len(page)), range(sessions))
+        )
+    seconds = time.perf_counter() - started
+    stop.set()
+    beat.join()
+    assert all(len(result["content"]) > 1000 for result in results)
+    return seconds, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent parsing with and without the CPU pool")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--page-kb", type=int, default=800)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    page = make_page(args.page_kb)
+    print(f"{args.sessions} sessions, {len(page) // 1024} KB pages, {os.cpu_count()} CPUs")
+
+    for label, executor in (
+        ("in-process", CpuStageExecutor(max_workers=0)),
+        (f"pool of {args.workers}", CpuStageExecutor(max_workers=args.workers)),
+    ):
+        executor.warm_up()
+        seconds, lags = run_sessions(executor, page, args.sessions)
+        print(
+            f"{label:>12}: {seconds:.2f}s total, heartbeat lag p50 {percentile(lags, 0.5):.1f} ms, "
+            f"p95 {percentile(lags, 0.95):.1f} ms, max {max(lags):.1f} ms"
+        )
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Exercise model routing and latency-based failover against the stub server.
+
+Start the stub with a slow primary model, e.g.
+
+    python benchmarks/stub_openai_server.py --latency gpt-4o=3 --latency gpt-4o-mini=0.2
+
+then run
+
+    python benchmarks/bench_model_routing.py --requests 20 --p95-threshold 1
+
+Each request prints the model it was routed to and its latency; after
+MODEL_LATENCY_MIN_SAMPLES slow calls the router should fail over. The
+threshold stands in for the summary type's latency SLO.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:8765/v1")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import get_model_stats, model_router  # noqa: E402
+from summarizer import generate_summary  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model routing and failover check")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--summary-type", default="deep_dive")
+    parser.add_argument("--content-words", type=int, default=2000)
+    parser.add_argument("--p95-threshold", type=float, default=1.0, help="failover threshold in seconds")
+    args = parser.parse_args()
+    model_router.latency_thresholds[args.summary_type] = args.p95_threshold
+
+    content = " ".join(["lorem"] * args.content_words)
+
+    for index in range(args.requests):
+        started = time.perf_counter()
+        summary_data = generate_summary(content, "Routing check", "2024-06-01", args.summary_type)
+        elapsed = time.perf_counter() - started
+        model = summary_data.get("model", summary_data.get("error"))
+        print(f"request {index + 1:>3}: {model:<14} {elapsed:6.2f}s")
+
+    print()
+    for model, stats in get_model_stats().items():
+        for task, task_stats in stats["tasks"].items():
+            p95 = f"{task_stats['p95_latency']:.2f}s" if task_stats["p95_latency"] is not None else "n/a"
+            print(
+                f"{model:<14} {task:<14} calls={task_stats['calls']:<4} p95={p95:<8} "
+                f"errors={task_stats['error_rate']:.0%} healthy={task_stats['healthy']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
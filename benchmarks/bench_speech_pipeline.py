@@ -0,0 +1,69 @@
+"""
+Compare sequential summary-then-speech against the overlapped pipeline.
+
+Start the stub with realistic generation and TTS speeds, e.g.
+
+    python benchmarks/stub_openai_server.py --token-delay 0.02 --tts-seconds-per-kchar 4
+
+then run
+
+    python benchmarks/bench_speech_pipeline.py --runs 3
+
+The pipelined time should approach max(LLM, TTS) rather than their sum.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:8765/v1")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_generator import generate_audio  # noqa: E402
+from speech_pipeline import generate_summary_with_audio  # noqa: E402
+from summarizer import generate_summary  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs pipelined summary and speech")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--summary-type", default="quick")
+    args = parser.parse_args()
+
+    content = " ".join(["lorem"] * 500)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for run in range(args.runs):
+            started = time.perf_counter()
+            summary_data = generate_summary(content, "Pipeline check", "2024-06-01", args.summary_type)
+            summary_seconds = time.perf_counter() - started
+            generate_audio(summary_data["summary"], "Pipeline check", output_dir)
+            sequential_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            first_text = []
+            summary_data, audio_data = generate_summary_with_audio(
+                content,
+                "Pipeline check",
+                "2024-06-01",
+                args.summary_type,
+                output_dir=output_dir,
+                on_text=lambda text: first_text or first_text.append(time.perf_counter() - started),
+            )
+            pipelined_seconds = time.perf_counter() - started
+            if "error" in (audio_data or {"error": summary_data.get("error")}):
+                print(f"run {run + 1}: pipeline failed: {summary_data.get('error') or audio_data['error']}")
+                continue
+
+            print(
+                f"run {run + 1}: summary {summary_seconds:.2f}s, "
+                f"sequential {sequential_seconds:.2f}s, pipelined {pipelined_seconds:.2f}s "
+                f"(first text after {first_text[0]:.2f}s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
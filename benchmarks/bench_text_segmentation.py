@@ -0,0 +1,104 @@
+"""
+Time TTS chunking and LLM truncation on multi-megabyte transcripts, comparing
+the previous string-splitting code with the text segmenter.
+
+    python benchmarks/bench_text_segmentation.py --sizes-mb 1 4 16
+
+No network access or API key is needed.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_segmenter import chunk_text, truncate_text  # noqa: E402
+
+WORDS = (
+    "so the thing about habits is that they compound over time and you don't notice "
+    "it at first but after a year the difference is huge Dr. Clear calls it 1.01 percent"
+).split()
+
+
+def make_text(size_bytes, punctuated, seed=0):
+    """Generate filler text, either plain like an auto-generated transcript or with sentences"""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size_bytes:
+        word = rng.choice(WORDS)
+        if punctuated and rng.random() < 0.06:
+            word += "."
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def old_chunk_text_for_tts(text, max_chars=4000):
+    """The previous chunker: split on '. ' and grow each chunk by concatenation"""
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    sentences = text.replace("\n", " ").split(". ")
+    current_chunk = ""
+    for sentence in sentences:
+        if sentence and not sentence.endswith("."):
+            sentence += "."
+        if len(current_chunk) + len(sentence) + 1 > max_chars:
+            if current_chunk:
+                chunks.append(current_chunk)
+            current_chunk = sentence
+        else:
+            current_chunk = current_chunk + " " + sentence if current_chunk else sentence
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def old_truncate_content(content, max_tokens=8000):
+    """The previous truncation: split all words, keep a proportional prefix"""
+    words = content.split()
+    approx_tokens = len(content) / 4
+    if approx_tokens <= max_tokens:
+        return content
+    keep_words = int(len(words) * max_tokens / approx_tokens)
+    return " ".join(words[:keep_words])
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text segmentation micro-benchmark")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-chars", type=int, default=4000)
+    parser.add_argument("--max-tokens", type=int, default=120000)
+    args = parser.parse_args()
+
+    for punctuated in (False, True):
+        kind = "punctuated" if punctuated else "transcript"
+        for size_mb in args.sizes_mb:
+            text = make_text(int(size_mb * 1024 * 1024), punctuated)
+
+            old_chunks, old_chunk_s = timed(old_chunk_text_for_tts, text, args.max_chars)
+            new_chunks, new_chunk_s = timed(chunk_text, text, max_chars=args.max_chars)
+            _, old_trunc_s = timed(old_truncate_content, text, args.max_tokens)
+            _, new_trunc_s = timed(truncate_text, text, args.max_tokens)
+
+            print(
+                f"{kind:>10} {size_mb:>5g} MB | chunk: old {old_chunk_s * 1000:7.1f} ms "
+                f"({len(old_chunks)} chunks, largest {max(map(len, old_chunks))}), "
+                f"new {new_chunk_s * 1000:7.1f} ms ({len(new_chunks)} chunks, largest {max(map(len, new_chunks))}) "
+                f"| truncate: old {old_trunc_s * 1000:7.1f} ms, new {new_trunc_s * 1000:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
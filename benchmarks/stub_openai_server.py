@@ -0,0 +1,201 @@
+"""
+Local stand-in for the OpenAI API, for exercising the pipeline without network
+access or API costs.
+
+Serves POST /v1/chat/completions (JSON-mode summaries, optionally streamed)
+and POST /v1/audio/speech (silent audio bytes). Latency and failures can be
+injected per model to test routing, deadlines and hedging, and generation
+speed can be set to test streaming and pipelining.
+
+Usage:
+    python benchmarks/stub_openai_server.py --port 8765 --latency gpt-4o=8 --error-rate gpt-4o-mini=0.3
+
+then point the app or a benchmark at it:
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run app.py
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_SUMMARY = (
+    "## Key Takeaways\n\n"
+    "- Small daily habits compound into large results over time.\n"
+    "- The environment shapes behavior more than motivation does.\n"
+    "- Systems create progress, while goals only set direction.\n"
+    "- Lasting change starts with identity. Decide who you want to be.\n"
+)
+
+
+def parse_model_values(pairs):
+    """Turn ["gpt-4o=2.5", "*=0.1"] into {"gpt-4o": 2.5, "*": 0.1}"""
+    values = {}
+    for pair in pairs or []:
+        model, value = pair.split("=", 1)
+        values[model] = float(value)
+    return values
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = {}
+    jitter = 0.0
+    error_rate = {}
+    token_delay = 0.0
+    summary_repeat = 1
+    tts_seconds_per_kchar = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _for_model(self, values, model):
+        return values.get(model, values.get("*", 0.0))
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject(self, model):
+        """Sleep for the model's configured latency; return True if the call should fail"""
+        delay = self._for_model(self.latency, model)
+        if delay or self.jitter:
+            time.sleep(max(0.0, delay + random.uniform(-self.jitter, self.jitter)))
+        return random.random() < self._for_model(self.error_rate, model)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "")
+
+        if self._inject(model):
+            self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(request, model)
+        elif self.path.endswith("/audio/speech"):
+            self._speech(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat_completion(self, request, model):
+        summary = STUB_SUMMARY * self.summary_repeat
+        content = json.dumps(
+            {
+                "response": {
+                    "summary": summary,
+                    "notes": summary,
+                    "published_date": "June 1, 2024",
+                }
+            }
+        )
+        # Like the real API, max_tokens cuts the JSON off mid-way
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            content = content[: max_tokens * 4]
+            finish_reason = "length"
+
+        if request.get("stream"):
+            self._stream_chat_completion(content, model, finish_reason)
+            return
+
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        completion_tokens = len(content) // 4
+        if self.token_delay:
+            time.sleep(completion_tokens * self.token_delay)
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_chars // 4 + completion_tokens,
+                },
+            },
+        )
+
+    def _stream_chat_completion(self, content, model, finish_reason="stop"):
+        """Send the completion as server-sent events, about 4 characters per token"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        pieces = [{"role": "assistant", "content": ""}] + [
+            {"content": content[index : index + 4]} for index in range(0, len(content), 4)
+        ]
+        for index, delta in enumerate(pieces + [{}]):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason if index == len(pieces) else None}
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _speech(self, request):
+        if self.tts_seconds_per_kchar:
+            time.sleep(len(request.get("input", "")) / 1000 * self.tts_seconds_per_kchar)
+        # Roughly 16 kB per 1000 characters of input, like low-bitrate speech
+        body = bytes(max(1024, len(request.get("input", "")) * 16))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", help="MODEL=SECONDS (use * for all models)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds added to latency")
+    parser.add_argument("--error-rate", action="append", help="MODEL=FRACTION (use * for all models)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--summary-repeat", type=int, default=1, help="Repeat the stub summary to lengthen it")
+    parser.add_argument(
+        "--tts-seconds-per-kchar", type=float, default=0.0, help="Extra TTS latency per 1000 input characters"
+    )
+    args = parser.parse_args()
+
+    StubHandler.latency = parse_model_values(args.latency)
+    StubHandler.jitter = args.jitter
+    StubHandler.error_rate = parse_model_values(args.error_rate)
+    StubHandler.token_delay = args.token_delay
+    StubHandler.summary_repeat = args.summary_repeat
+    StubHandler.tts_seconds_per_kchar = args.tts_seconds_per_kchar
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub OpenAI API listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
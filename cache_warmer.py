@@ -0,0 +1,408 @@
+import os
+import argparse
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from audio_generator import AUDIO_FORMATS, DEFAULT_AUDIO_SETTINGS, audio_settings_key
+from content_extractor import extract_content, is_youtube_collection_url
+from deadlines import REQUEST_DEADLINE_SECONDS, Deadline
+from dedup_index import content_signature, find_duplicate, remember_audio, remember_summary
+from output_budgets import output_budgets
+from speech_pipeline import generate_summary_with_audio
+from summarizer import uncached_sections
+from text_segmenter import approximate_token_count
+from url_canonicalizer import cache_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WARMING_ENABLED = os.getenv("WARMING_ENABLED", "false").lower() in ("1", "true", "yes")
+ACCESS_LOG_PATH = os.getenv("ACCESS_LOG_PATH", "access_log.jsonl")
+WARM_SEED_FILE = os.getenv("WARM_SEED_FILE", "")
+# Local time window in which warming may run, e.g. "01:00-06:00" (empty: any time)
+WARM_WINDOW = os.getenv("WARM_WINDOW", "01:00-06:00")
+WARM_INTERVAL_MINUTES = float(os.getenv("WARM_INTERVAL_MINUTES", "30"))
+WARM_TOP_URLS = int(os.getenv("WARM_TOP_URLS", "20"))
+WARM_MAX_CONCURRENCY = int(os.getenv("WARM_MAX_CONCURRENCY", "2"))
+# Estimated model tokens warming may spend in any 24 hours
+WARM_TOKEN_BUDGET = int(os.getenv("WARM_TOKEN_BUDGET", "2000000"))
+# Summary types to warm when the log has not shown which ones a URL gets
+WARM_SUMMARY_TYPES = [
+    summary_type.strip() for summary_type in os.getenv("WARM_SUMMARY_TYPES", "quick").split(",") if summary_type.strip()
+]
+WARM_TYPES_PER_URL = int(os.getenv("WARM_TYPES_PER_URL", "2"))
+# A request counts half as much after this many hours
+WARM_HALF_LIFE_HOURS = float(os.getenv("WARM_HALF_LIFE_HOURS", "24"))
+WARM_LOOKBACK_DAYS = float(os.getenv("WARM_LOOKBACK_DAYS", "7"))
+# Only the tail of a large access log is read
+ACCESS_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+# Warmed audio lives outside the app's short-lived audio directory
+WARM_AUDIO_DIR = os.getenv("WARM_AUDIO_DIR", os.path.join("audio_files", "warm"))
+WARM_AUDIO_MAX_AGE_HOURS = float(os.getenv("WARM_AUDIO_MAX_AGE_HOURS", "24"))
+
+# Summaries are generated from at most this many input tokens (see truncate_content)
+MAX_SUMMARY_INPUT_TOKENS = 120000
+# Prompt and generated notes of one section-notes call, on top of the section text
+SECTION_NOTES_CALL_TOKENS = 800
+
+URL_REGEX = re.compile(r"https?://[^\s<>\"'\])]+")
+
+_access_log_lock = threading.Lock()
+
+
+def log_access(url, summary_type, cache_hit):
+    """Append one user request to the access log"""
+    record = {"timestamp": time.time(), "url": url, "summary_type": summary_type, "cache_hit": cache_hit}
+    try:
+        with _access_log_lock, open(ACCESS_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logger.error(f"Error writing access log: {str(e)}")
+
+
+def _read_lines(path, max_bytes=None):
+    with open(path, "rb") as f:
+        if max_bytes and os.fstat(f.fileno()).st_size > max_bytes:
+            f.seek(-max_bytes, os.SEEK_END)
+            f.readline()  # skip the partial first line
+        for line in f:
+            yield line.decode("utf-8", errors="replace")
+
+
+def read_url_events(path, max_bytes=None):
+    """
+    Read (url, timestamp, summary_type) events from a JSONL file. Access log
+    records carry all three; seed records may only have a URL, or a title
+    and body that mention URLs.
+    """
+    events = []
+    if not path or not os.path.exists(path):
+        return events
+
+    for line in _read_lines(path, max_bytes):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(record, dict):
+            continue
+
+        if record.get("url"):
+            urls = [record["url"]]
+        else:
+            text = f"{record.get('title', '')} {record.get('body', '')}"
+            urls = [url.rstrip(".,;:!?") for url in URL_REGEX.findall(text)]
+        for url in urls:
+            events.append((url, record.get("timestamp"), record.get("summary_type")))
+    return events
+
+
+def rank_urls(events, now=None, half_life_hours=WARM_HALF_LIFE_HOURS, lookback_days=WARM_LOOKBACK_DAYS):
+    """
+    Rank URLs by their requests, each weighted by how recent it is. Events
+    without a timestamp (seeds) count as one request made just now. Returns
+    [{"url", "score", "requests", "summary_types"}], best first.
+    """
+    now = now or time.time()
+    decay = math.log(2) / (half_life_hours * 3600)
+    scores = defaultdict(float)
+    requests = Counter()
+    summary_types = defaultdict(Counter)
+    first_url = {}
+
+    for url, timestamp, summary_type in events:
+        age = max(0.0, now - timestamp) if timestamp else 0.0
+        if age > lookback_days * 86400 or is_youtube_collection_url(url):
+            continue
+        key = cache_key(url)
+        first_url.setdefault(key, url)
+        scores[key] += math.exp(-decay * age)
+        requests[key] += 1
+        if summary_type:
+            summary_types[key][summary_type] += 1
+
+    ranked = [
+        {
+            "url": first_url[key],
+            "score": score,
+            "requests": requests[key],
+            "summary_types": [summary_type for summary_type, _ in summary_types[key].most_common()],
+        }
+        for key, score in scores.items()
+    ]
+    ranked.sort(key=lambda entry: entry["score"], reverse=True)
+    return ranked
+
+
+def in_window(window, now=None):
+    """Whether the local time is inside a "HH:MM-HH:MM" window (which may wrap midnight)"""
+    if not window:
+        return True
+    start, end = [datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-")]
+    current = (now or datetime.now()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class TokenBudget:
+    """Estimated tokens that may be spent in any rolling 24 hours"""
+
+    def __init__(self, tokens_per_day=WARM_TOKEN_BUDGET):
+        self.tokens_per_day = tokens_per_day
+        self._spent = deque()
+        self._lock = threading.Lock()
+
+    def _remaining(self):
+        cutoff = time.time() - 86400
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return self.tokens_per_day - sum(tokens for _, tokens in self._spent)
+
+    def remaining(self):
+        with self._lock:
+            return self._remaining()
+
+    def reserve(self, tokens):
+        """Take tokens from the budget; False if there are not enough left"""
+        with self._lock:
+            if self._remaining() < tokens:
+                return False
+            self._spent.append((time.time(), tokens))
+            return True
+
+
+class CacheWarmer:
+    """
+    Pre-computes extraction, summaries and audio for the top-ranked URLs so
+    the users who ask for them next get cache hits. The caches it fills are
+    in-process, so it runs as a background thread of the app.
+    """
+
+    def __init__(self, access_log_path=ACCESS_LOG_PATH, seed_path=WARM_SEED_FILE, budget=None):
+        self.access_log_path = access_log_path
+        self.seed_path = seed_path
+        self.budget = budget or TokenBudget()
+        self.audio_settings = DEFAULT_AUDIO_SETTINGS
+        self.runs = 0
+        self.urls_warmed = 0
+        self.summaries_generated = 0
+        self.tokens_spent = 0
+        self.user_requests = 0
+        self.summary_hits = 0
+        self.audio_hits = 0
+        self._warmed_docs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def rank(self):
+        events = read_url_events(self.access_log_path, ACCESS_LOG_MAX_BYTES)
+        events += read_url_events(self.seed_path)
+        return rank_urls(events)
+
+    @staticmethod
+    def _section_notes_tokens(content_data):
+        """Estimated tokens of the section-notes calls a summary of this content would make"""
+        content = content_data["content"]
+        return sum(
+            approximate_token_count(content[section["start"] : section["end"]]) + SECTION_NOTES_CALL_TOKENS
+            for section in uncached_sections(content, content_data["sections"])
+        )
+
+    def _summary_types(self, entry):
+        summary_types = entry["summary_types"] or WARM_SUMMARY_TYPES
+        return summary_types[:WARM_TYPES_PER_URL]
+
+    def warm_url(self, entry):
+        """Extract one URL and generate its missing summaries and audio"""
+        url = entry["url"]
+        deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+        content_data = extract_content(url, deadline=deadline)
+        if "error" in content_data:
+            logger.info(f"Skipping warm-up of {url}: {content_data['error']}")
+            return
+
+        signature = content_signature(content_data["content"])
+        section_hashes = [section["hash"] for section in content_data["sections"]]
+        input_tokens = min(approximate_token_count(content_data["content"]), MAX_SUMMARY_INPUT_TOKENS)
+        audio_settings_id = audio_settings_key(self.audio_settings)
+        notes_tokens = self._section_notes_tokens(content_data)
+        # Every summary type of the URL is stored on one indexed document
+        doc_id = None
+
+        for summary_type in self._summary_types(entry):
+            audio_key = f"{summary_type}:{audio_settings_id}"
+            duplicate = find_duplicate(
+                signature,
+                summary_type,
+                audio_key=audio_key,
+                canonical_url=content_data["canonical_url"],
+                section_hashes=section_hashes,
+            )
+            if duplicate and duplicate["audio_data"]:
+                continue
+            estimate = input_tokens + notes_tokens + (output_budgets.max_tokens(summary_type) or 0)
+            if not self.budget.reserve(estimate):
+                logger.info(f"Warm-up token budget exhausted before {summary_type} summary of {url}")
+                return
+            # Section notes are cached, so only the first summary type pays for them
+            notes_tokens = 0
+
+            summary_data, audio_data = generate_summary_with_audio(
+                content_data["content"],
+                content_data["title"],
+                content_data["publish_date"],
+                summary_type,
+                output_dir=WARM_AUDIO_DIR,
+                sections=content_data.get("sections"),
+                settings=self.audio_settings,
+                deadline=Deadline(REQUEST_DEADLINE_SECONDS),
+            )
+            if "error" in summary_data:
+                logger.error(f"Warm-up of {summary_type} summary for {url} failed: {summary_data['error']}")
+                continue
+
+            doc_id = remember_summary(
+                signature,
+                summary_type,
+                summary_data,
+                doc_id=doc_id,
+                canonical_url=content_data["canonical_url"],
+                section_hashes=section_hashes,
+            )
+            if audio_data and "error" not in audio_data:
+                remember_audio(doc_id, audio_key, audio_data)
+            with self._lock:
+                self._warmed_docs.add(doc_id)
+                self.summaries_generated += 1
+                self.tokens_spent += estimate
+
+        with self._lock:
+            self.urls_warmed += 1
+
+    def run_once(self, limit=WARM_TOP_URLS):
+        """Warm the top-ranked URLs within the concurrency and token budget"""
+        ranked = self.rank()[:limit]
+        logger.info(f"Warming {len(ranked)} URLs, {self.budget.remaining()} tokens left in budget")
+        Path(WARM_AUDIO_DIR).mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=WARM_MAX_CONCURRENCY) as executor:
+            for entry, future in [(entry, executor.submit(self.warm_url, entry)) for entry in ranked]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error warming {entry['url']}: {str(e)}")
+
+        with self._lock:
+            self.runs += 1
+        self.remove_old_audio()
+
+    def remove_old_audio(self):
+        """Delete warmed audio files past their retention"""
+        cutoff = time.time() - WARM_AUDIO_MAX_AGE_HOURS * 3600
+        for audio_format in AUDIO_FORMATS.values():
+            for file_path in Path(WARM_AUDIO_DIR).glob(f"*.{audio_format['extension']}"):
+                try:
+                    if os.path.getmtime(file_path) < cutoff:
+                        os.remove(file_path)
+                except OSError as e:
+                    logger.error(f"Error deleting warmed audio file {file_path}: {str(e)}")
+
+    def record_request(self, duplicate):
+        """Count a user request, and whether it was served from a warmed entry"""
+        with self._lock:
+            self.user_requests += 1
+            if duplicate and duplicate["doc_id"] in self._warmed_docs:
+                self.summary_hits += 1
+                if duplicate["audio_data"]:
+                    self.audio_hits += 1
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if in_window(WARM_WINDOW) and self.budget.remaining() > 0:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Error in cache warming run: {str(e)}")
+            self._stop.wait(WARM_INTERVAL_MINUTES * 60)
+
+    def start(self):
+        """Start warming in a background thread (once per process)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+            self._thread.start()
+        logger.info(f"Cache warmer started (window {WARM_WINDOW or 'any time'})")
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self._thread is not None,
+                "runs": self.runs,
+                "urls_warmed": self.urls_warmed,
+                "summaries_generated": self.summaries_generated,
+                "tokens_spent": self.tokens_spent,
+                "user_requests": self.user_requests,
+                "summary_hits": self.summary_hits,
+                "audio_hits": self.audio_hits,
+                "hit_rate": self.summary_hits / self.user_requests if self.user_requests else 0.0,
+            }
+
+
+# Process-wide warmer shared by all sessions
+cache_warmer = CacheWarmer()
+
+
+def start_cache_warmer():
+    """Start background warming if it is enabled"""
+    if WARMING_ENABLED:
+        cache_warmer.start()
+
+
+def record_user_request(url, summary_type, duplicate):
+    """Log a user request for ranking and count warm-cache hits"""
+    log_access(url, summary_type, cache_hit=duplicate is not None)
+    cache_warmer.record_request(duplicate)
+
+
+def get_warming_stats():
+    """Return what the warmer has done and how many user requests it served"""
+    return cache_warmer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank URLs for cache warming, or warm them once")
+    parser.add_argument("--access-log", default=ACCESS_LOG_PATH)
+    parser.add_argument("--seed", default=WARM_SEED_FILE)
+    parser.add_argument("--top", type=int, default=WARM_TOP_URLS)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the ranking")
+    args = parser.parse_args()
+
+    warmer = CacheWarmer(access_log_path=args.access_log, seed_path=args.seed)
+    ranked = warmer.rank()[: args.top]
+    for index, entry in enumerate(ranked, start=1):
+        summary_types = ", ".join(warmer._summary_types(entry))
+        print(f"{index:>3}. {entry['score']:6.2f} ({entry['requests']} requests) {entry['url']} [{summary_types}]")
+
+    if not args.dry_run:
+        warmer.run_once(limit=args.top)
+        print(json.dumps(warmer.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,178 @@
 import datetime
+import hashlib
 import os
 import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
 from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
 import logging
 
+from cpu_pool import run_cpu_stage
+from deadlines import DeadlineExceeded, call_with_deadline, request_timeout
+from text_segmenter import sentence_spans
+from url_canonicalizer import (
+    cache_key,
+    extract_youtube_playlist_id,
+    extract_youtube_video_id,
+    is_youtube_channel_url,
+    is_youtube_playlist_url,
+    remember_redirect,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sections are the unit of change detection and incremental re-summarization.
+# Their boundaries depend on the content around them rather than on their
+# offset, so an edit only changes the sections near it: a section ends after
+# a paragraph whose hash falls under a threshold proportional to its length,
+# which makes sections SECTION_TARGET_CHARS long on average (never shorter
+# than SECTION_MIN_CHARS or longer than SECTION_MAX_CHARS).
+SECTION_MIN_CHARS = 1000
+SECTION_TARGET_CHARS = 3000
+SECTION_MAX_CHARS = 6000
+
+# Last seen section fingerprints per canonical URL
+CONTENT_FINGERPRINTS_SIZE = 4096
+_content_fingerprints = OrderedDict()
+_content_fingerprints_lock = threading.Lock()
+
+# Recently extracted content per canonical URL, so repeated requests skip the
+# fetch. Off by default: a cached extraction does not see updates to the page.
+EXTRACTION_CACHE_TTL_SECONDS = float(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", "0"))
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "32"))
+_extractions = OrderedDict()
+_extractions_lock = threading.Lock()
 
-def is_youtube_url(url):
-    """Check if the URL is a YouTube URL"""
-    youtube_regex = (
-        r"(https?://)?(www\.)?"
-        r"(youtube|youtu|youtube-nocookie)\.(com|be)/"
-        r"(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})"
-    )
 
-    match = re.match(youtube_regex, url)
-    return bool(match)
+def is_youtube_url(url):
+    """Check if the URL is a YouTube video URL"""
+    return extract_youtube_video_id(url) is not None
 
 
 def extract_youtube_id(url):
     """Extract the YouTube video ID from a URL"""
-    if "youtu.be" in url:
-        return url.split("/")[-1]
+    return extract_youtube_video_id(url)
+
+
+def is_youtube_collection_url(url):
+    """Check if the URL is a YouTube playlist or channel (many videos)"""
+    return is_youtube_playlist_url(url) or is_youtube_channel_url(url)
+
+
+def get_youtube_channel_uploads_id(url, api_key):
+    """
+    Resolve a YouTube channel URL to the ID of its "uploads" playlist.
+    :param url: Channel URL (/@handle, /channel/UC..., /c/name or /user/name)
+    :param api_key: Your Google API Key
+    :return: Uploads playlist ID if available
+    """
+    parsed_url = urlparse(url if "://" in url else f"https://{url}")
+    parts = [part for part in parsed_url.path.split("/") if part]
+
+    if parts[0].startswith("@"):
+        lookup = f"forHandle={parts[0]}"
+    elif parts[0] == "channel":
+        lookup = f"id={parts[1]}"
+    elif parts[0] == "user":
+        lookup = f"forUsername={parts[1]}"
+    else:
+        # Custom /c/ URLs are not addressable through the API, so read the
+        # channel ID from the channel page itself
+        response = requests.get(url, timeout=30)
+        match = re.search(r'"(?:externalId|channelId)":"(UC[\w-]{22})"', response.text)
+        if not match:
+            return {"error": "Could not resolve YouTube channel."}
+        lookup = f"id={match.group(1)}"
+
+    api_url = f"https://www.googleapis.com/youtube/v3/channels?part=contentDetails&{lookup}&key={api_key}"
+    channel_data = requests.get(api_url, timeout=30).json()
+
+    if "items" not in channel_data or not channel_data["items"]:
+        return {"error": "Channel not found."}
+
+    uploads_id = channel_data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    return {"playlist_id": uploads_id}
+
+
+def get_youtube_playlist_videos(playlist_id, api_key, max_videos=None):
+    """
+    Enumerate the videos of a YouTube playlist using the YouTube Data API v3.
+    :param playlist_id: Playlist Id
+    :param api_key: Your Google API Key
+    :param max_videos: Stop after this many videos (None for the whole playlist)
+    :return: List of videos with their id, title and published date
+    """
+    videos = []
+    page_token = ""
+
+    while True:
+        url = (
+            "https://www.googleapis.com/youtube/v3/playlistItems"
+            f"?part=snippet,contentDetails&maxResults=50&playlistId={playlist_id}"
+            f"&pageToken={page_token}&key={api_key}"
+        )
+        playlist_data = requests.get(url, timeout=30).json()
+
+        if "error" in playlist_data:
+            return {"error": playlist_data["error"].get("message", "Playlist not found.")}
+
+        for item in playlist_data.get("items", []):
+            published_at = item["contentDetails"].get("videoPublishedAt")
+            videos.append(
+                {
+                    "video_id": item["contentDetails"]["videoId"],
+                    "title": item["snippet"].get("title", "Unknown Title"),
+                    "publish_date": published_at[:10] if published_at else "Date not available.",
+                }
+            )
+            if max_videos and len(videos) >= max_videos:
+                return {"videos": videos}
+
+        page_token = playlist_data.get("nextPageToken")
+        if not page_token:
+            return {"videos": videos}
+
+
+def get_youtube_collection_videos(url, max_videos=None):
+    """Enumerate the videos of a YouTube playlist or channel URL"""
+    api_key = os.getenv("YOU_TUBE_API_KEY")
+
+    try:
+        if is_youtube_playlist_url(url):
+            playlist_id = extract_youtube_playlist_id(url)
+        else:
+            uploads_data = get_youtube_channel_uploads_id(url, api_key)
+            if "error" in uploads_data:
+                return uploads_data
+            playlist_id = uploads_data["playlist_id"]
+
+        if not playlist_id:
+            return {"error": "Could not extract YouTube playlist ID"}
 
-    video_id = None
-    parsed_url = urlparse(url)
-    if "youtube.com" in parsed_url.netloc:
-        if "v=" in parsed_url.query:
-            query_params = parsed_url.query.split("&")
-            for param in query_params:
-                if param.startswith("v="):
-                    video_id = param[2:]
-                    break
-    return video_id
+        return get_youtube_playlist_videos(playlist_id, api_key, max_videos=max_videos)
+    except Exception as e:
+        logger.error(f"Error listing YouTube videos: {str(e)}")
+        return {"error": f"Failed to list videos: {str(e)}"}
 
 
-def get_published_date(video_id, api_key):
+def get_published_date(video_id, api_key, deadline=None):
     """
     Fetches the published date of a YouTube video using the YouTube Data API v3.
     :param video_id: Video Id
     :param api_key: Your Google API Key
+    :param deadline: Optional Deadline for the request
     :return: Published date if available
     """
     # Step 1: Get video details (including published date)
     url = f"https://www.googleapis.com/youtube/v3/videos?part=snippet&id={video_id}&key={api_key}"
-    video_response = requests.get(url)
+    video_response = requests.get(url, timeout=request_timeout(deadline, stage="extraction"))
     video_data = video_response.json()
 
     if "items" not in video_data or not video_data["items"]:
@@ -66,7 +189,25 @@ def get_published_date(video_id, api_key):
         return {"error": "Error parsing published date."}
 
 
-def get_youtube_content(url):
+def join_transcript(transcript_list):
+    """Join the entries of a transcript into a single string"""
+    return " ".join([entry["text"] for entry in transcript_list])
+
+
+def get_youtube_transcript(video_id, deadline=None):
+    """
+    Fetch the transcript of a YouTube video as a single string.
+    The fetch is network I/O and the join is cheaper than pickling the
+    entries for a worker process, so both run on the fetching thread.
+    """
+    return call_with_deadline(
+        lambda: join_transcript(YouTubeTranscriptApi.get_transcript(video_id)),
+        deadline=deadline,
+        stage="transcript",
+    )
+
+
+def get_youtube_content(url, deadline=None):
     """Extract transcript and metadata from a YouTube video"""
     video_id = extract_youtube_id(url)
     if not video_id:
@@ -75,7 +216,7 @@ def get_youtube_content(url):
     try:
         # Get published date
         published_date_data = get_published_date(
-            video_id, os.getenv("YOU_TUBE_API_KEY")
+            video_id, os.getenv("YOU_TUBE_API_KEY"), deadline=deadline
         )
         if "error" in published_date_data:
             published_date = "Date not available."
@@ -83,16 +224,17 @@ def get_youtube_content(url):
             published_date = published_date_data["published_date"]
 
         # Get the transcript
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        transcript_text = " ".join([entry["text"] for entry in transcript_list])
+        transcript_text = get_youtube_transcript(video_id, deadline=deadline)
 
         # Get video title and publish date (this is simplified - in a real app, you'd use the YouTube API)
         # For now, we'll scrape it from the page
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        title = soup.find("meta", property="og:title")
-        title = title["content"] if title else "Unknown Title"
+        response = requests.get(
+            f"https://www.youtube.com/watch?v={video_id}",
+            timeout=request_timeout(deadline, stage="extraction"),
+        )
+        title = run_cpu_stage(
+            parse_youtube_title, response.content, deadline=deadline, size=len(response.content)
+        )
 
         return {
             "title": title,
@@ -102,6 +244,9 @@ def get_youtube_content(url):
         }
     except TranscriptsDisabled:
         return {"error": "Transcripts are disabled for this video"}
+    except DeadlineExceeded as e:
+        logger.error(f"Error extracting YouTube content: {str(e)}")
+        return {"error": str(e)}
     except Exception as e:
         logger.error(f"Error extracting YouTube content: {str(e)}")
 
@@ -111,90 +256,305 @@ def get_youtube_content(url):
         return {"error": f"Failed to extract content: {str(e)}"}
 
 
-def get_article_content(url):
+def parse_youtube_title(html):
+    """Read the title of a YouTube watch page from its og:title meta tag"""
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("meta"))
+    title = soup.find("meta", property="og:title")
+    return title["content"] if title else "Unknown Title"
+
+
+def parse_article_html(html, encoding=None):
+    """Extract the title, publish date and main text from raw article HTML"""
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding)
+
+    # Extract title
+    title = soup.find("title")
+    title = title.text if title else "Unknown Title"
+
+    # Try to find publish date (this is a simplification)
+    publish_date = "Date not available"
+    date_meta_tags = soup.select(
+        'meta[property="article:published_time"], meta[name="pubdate"], meta[name="publishdate"], meta[name="date"]'
+    )
+
+    if date_meta_tags:
+        publish_date = date_meta_tags[0].get("content", "Date not available")
+
+    # Extract main content (this is a simplified approach)
+    # A more robust solution would use libraries like newspaper3k or trafilatura
+    # or implement more sophisticated content extraction algorithms
+
+    # Remove script, style tags and comments
+    for element in soup(["script", "style", "header", "footer", "nav", "aside"]):
+        element.decompose()
+
+    # Find the main content - this is a heuristic approach
+    main_content = None
+
+    # Try to find article tag first
+    article = soup.find("article")
+    if article:
+        main_content = article
+
+    # If no article tag, look for main tag
+    if not main_content:
+        main_content = soup.find("main")
+
+    # If neither article nor main, look for div with common content class names
+    if not main_content:
+        content_divs = soup.select(
+            "div.content, div.post, div.post-content, div.entry, div.entry-content, div.article-body"
+        )
+        if content_divs:
+            main_content = content_divs[0]
+
+    # If still no main content, use the body
+    if not main_content:
+        main_content = soup.body
+
+    # Extract text from main content
+    if main_content:
+        paragraphs = main_content.find_all("p")
+        content = "\n\n".join([p.text for p in paragraphs])
+    else:
+        content = "Could not extract content from this article"
+
+    if (
+        not content or len(content) < 100
+    ):  # If content is too short, it's probably not the main content
+        # Fall back to extracting all visible text from the body
+        content = soup.body.get_text(separator=" ", strip=True)
+
+    return {"title": title, "publish_date": publish_date, "content": content}
+
+
+def get_article_content(url, deadline=None):
     """Extract main content from an article or blog post"""
     try:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, "html.parser")
+        response = requests.get(
+            url, headers=headers, timeout=request_timeout(deadline, stage="extraction")
+        )
+        remember_redirect(url, response.url)
+
+        # Parsing is CPU-bound, so large pages are parsed in a worker process
+        article = run_cpu_stage(
+            parse_article_html,
+            response.content,
+            response.encoding,
+            deadline=deadline,
+            size=len(response.content),
+        )
+        return {**article, "source_type": "article"}
+    except DeadlineExceeded as e:
+        logger.error(f"Error extracting article content: {str(e)}")
+        return {"error": str(e)}
+    except Exception as e:
+        logger.error(f"Error extracting article content: {str(e)}")
+        return {"error": f"Failed to extract content: {str(e)}"}
 
-        # Extract title
-        title = soup.find("title")
-        title = title.text if title else "Unknown Title"
 
-        # Try to find publish date (this is a simplification)
-        publish_date = "Date not available"
-        date_meta_tags = soup.select(
-            'meta[property="article:published_time"], meta[name="pubdate"], meta[name="publishdate"], meta[name="date"]'
+def _section_units(content, max_chars):
+    """Yield (start, end) of each paragraph, or of each sentence of a paragraph longer than max_chars"""
+    for match in re.finditer(r"[^\n]+(?:\n(?!\n)[^\n]*)*", content):
+        para_start, para_end = match.span()
+        if para_end - para_start > max_chars:
+            yield from sentence_spans(content, para_start, para_end)
+        else:
+            yield para_start, para_end
+
+
+def _is_section_end(unit, target_chars):
+    """Content-defined cut point: true for about len(unit) / target_chars of units"""
+    unit_hash = zlib.crc32(" ".join(unit.split()).encode("utf-8"))
+    return unit_hash < len(unit) / target_chars * 0xFFFFFFFF
+
+
+def split_sections(
+    content,
+    min_chars=SECTION_MIN_CHARS,
+    target_chars=SECTION_TARGET_CHARS,
+    max_chars=SECTION_MAX_CHARS,
+):
+    """
+    Split content into (start, end) spans of at most max_chars.
+    Sections end after paragraphs (or, in a paragraph longer than max_chars
+    such as a transcript, sentences) chosen by their content, so inserting or
+    editing a paragraph leaves the boundaries of the other sections in place.
+    """
+    spans = []
+    start = end = None
+
+    for unit_start, unit_end in _section_units(content, max_chars):
+        if start is not None and unit_end - start > max_chars:
+            spans.append((start, end))
+            start = None
+        if start is None:
+            start = unit_start
+        end = unit_end
+
+        if end - start >= min_chars and _is_section_end(content[unit_start:unit_end], target_chars):
+            spans.append((start, end))
+            start = None
+
+    if start is not None:
+        spans.append((start, end))
+    return spans
+
+
+def section_fingerprints(content):
+    """Return (start, end, hash) for each section of content"""
+    fingerprints = []
+    for start, end in split_sections(content):
+        normalized = " ".join(content[start:end].split())
+        fingerprints.append((start, end, hashlib.sha1(normalized.encode("utf-8")).hexdigest()))
+    return fingerprints
+
+
+def fingerprint_sections(content, deadline=None):
+    """Return the sections of content with a fingerprint of each one"""
+    fingerprints = run_cpu_stage(
+        section_fingerprints, content, deadline=deadline, stage="fingerprinting", size=len(content)
+    )
+    return [{"start": start, "end": end, "hash": section_hash} for start, end, section_hash in fingerprints]
+
+
+def track_content_changes(url, content_data, deadline=None):
+    """
+    Fingerprint the extracted content and compare it with the last extraction
+    of the same canonical URL. Adds "sections" and "changed_sections" (indices of
+    sections not seen before) to content_data.
+    """
+    sections = fingerprint_sections(content_data["content"], deadline=deadline)
+    hashes = [section["hash"] for section in sections]
+
+    with _content_fingerprints_lock:
+        previous_hashes = set(_content_fingerprints.get(url, ()))
+        _content_fingerprints[url] = hashes
+        _content_fingerprints.move_to_end(url)
+        while len(_content_fingerprints) > CONTENT_FINGERPRINTS_SIZE:
+            _content_fingerprints.popitem(last=False)
+
+    content_data["sections"] = sections
+    content_data["changed_sections"] = [
+        index for index, section_hash in enumerate(hashes) if section_hash not in previous_hashes
+    ]
+    if previous_hashes:
+        logger.info(
+            f"{len(content_data['changed_sections'])} of {len(sections)} sections changed for {url}"
         )
+    return content_data
+
+
+def extract_content(url, deadline=None):
+    """
+    Extract content from a URL (either YouTube or article).
+    Network calls give up once the optional deadline passes.
+    """
+    if not url:
+        return {"error": "URL is empty"}
 
-        if date_meta_tags:
-            publish_date = date_meta_tags[0].get("content", "Date not available")
+    cached = get_cached_extraction(url)
+    if cached:
+        logger.info(f"Using content extracted {cached['extracted_seconds_ago']:.0f}s ago for {url}")
+        return cached
 
-        # Extract main content (this is a simplified approach)
-        # A more robust solution would use libraries like newspaper3k or trafilatura
-        # or implement more sophisticated content extraction algorithms
+    if is_youtube_url(url):
+        content_data = get_youtube_content(url, deadline=deadline)
+    else:
+        content_data = get_article_content(url, deadline=deadline)
 
-        # Remove script, style tags and comments
-        for element in soup(["script", "style", "header", "footer", "nav", "aside"]):
-            element.decompose()
+    if "error" not in content_data:
+        content_data["canonical_url"] = cache_key(url)
+        track_content_changes(content_data["canonical_url"], content_data, deadline=deadline)
+        cache_extraction(content_data)
+    return content_data
 
-        # Find the main content - this is a heuristic approach
-        main_content = None
 
-        # Try to find article tag first
-        article = soup.find("article")
-        if article:
-            main_content = article
+def get_cached_extraction(url):
+    """Return a copy of recently extracted content for a URL, or None"""
+    if EXTRACTION_CACHE_TTL_SECONDS <= 0:
+        return None
 
-        # If no article tag, look for main tag
-        if not main_content:
-            main_content = soup.find("main")
+    key = cache_key(url)
+    with _extractions_lock:
+        entry = _extractions.get(key)
+        if entry is None:
+            return None
+        extracted_at, content_data = entry
+        age = time.monotonic() - extracted_at
+        if age > EXTRACTION_CACHE_TTL_SECONDS:
+            del _extractions[key]
+            return None
+        _extractions.move_to_end(key)
 
-        # If neither article nor main, look for div with common content class names
-        if not main_content:
-            content_divs = soup.select(
-                "div.content, div.post, div.post-content, div.entry, div.entry-content, div.article-body"
-            )
-            if content_divs:
-                main_content = content_divs[0]
+    return {**content_data, "extracted_seconds_ago": age}
 
-        # If still no main content, use the body
-        if not main_content:
-            main_content = soup.body
 
-        # Extract text from main content
-        if main_content:
-            paragraphs = main_content.find_all("p")
-            content = " ".join([p.text for p in paragraphs])
-        else:
-            content = "Could not extract content from this article"
+def cache_extraction(content_data):
+    """Remember extracted content under its canonical URL"""
+    if EXTRACTION_CACHE_TTL_SECONDS <= 0:
+        return
+
+    with _extractions_lock:
+        _extractions[content_data["canonical_url"]] = (time.monotonic(), content_data)
+        _extractions.move_to_end(content_data["canonical_url"])
+        while len(_extractions) > EXTRACTION_CACHE_SIZE:
+            _extractions.popitem(last=False)
 
-        if (
-            not content or len(content) < 100
-        ):  # If content is too short, it's probably not the main content
-            # Fall back to extracting all visible text from the body
-            content = soup.body.get_text(separator=" ", strip=True)
 
+def get_youtube_video_content(video, deadline=None):
+    """
+    Fetch the transcript for one video of a playlist or channel.
+    Metadata comes from the playlist listing, so only the transcript is fetched.
+    """
+    try:
+        if deadline:
+            # Queued fetches are not started once the playlist is out of time
+            deadline.check("transcripts")
         return {
-            "title": title,
-            "publish_date": publish_date,
-            "content": content,
-            "source_type": "article",
+            "video_id": video["video_id"],
+            "url": f"https://www.youtube.com/watch?v={video['video_id']}",
+            "title": video["title"],
+            "publish_date": video["publish_date"],
+            "content": get_youtube_transcript(video["video_id"], deadline=deadline),
+            "source_type": "youtube",
         }
+    except TranscriptsDisabled:
+        error = "Transcripts are disabled for this video"
     except Exception as e:
-        logger.error(f"Error extracting article content: {str(e)}")
-        return {"error": f"Failed to extract content: {str(e)}"}
+        logger.error(f"Error extracting transcript for {video['video_id']}: {str(e)}")
+        if "Could not retrieve a transcript for the video" in str(e):
+            error = "Transcripts are disabled for this video"
+        else:
+            error = f"Failed to extract content: {str(e)}"
 
+    return {
+        "video_id": video["video_id"],
+        "url": f"https://www.youtube.com/watch?v={video['video_id']}",
+        "title": video["title"],
+        "error": error,
+    }
 
-def extract_content(url):
-    """Extract content from a URL (either YouTube or article)"""
-    if not url:
-        return {"error": "URL is empty"}
 
-    if is_youtube_url(url):
-        return get_youtube_content(url)
-    else:
-        return get_article_content(url)
+def iter_youtube_collection_content(videos, max_workers=8, deadline=None):
+    """
+    Fetch transcripts for many videos concurrently.
+
+    Transcripts are fetched on a bounded thread pool and yielded as soon as each
+    one completes, so callers can start summarizing before the whole playlist
+    is done. A failing video yields a dict with an "error" key and does not
+    affect the others. Iteration stops early once the optional deadline passes.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(get_youtube_video_content, video, deadline) for video in videos]
+    try:
+        for future in as_completed(futures, timeout=request_timeout(deadline, stage="transcripts")):
+            yield future.result()
+    except (TimeoutError, DeadlineExceeded):
+        logger.warning("Deadline exceeded while fetching playlist transcripts")
+    finally:
+        # Stop fetching if the consumer goes away early or time runs out
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,161 @@
+import os
+import logging
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from deadlines import DeadlineExceeded, call_with_deadline, request_timeout
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# CPU-bound stages (HTML parsing, section hashing) run in
+# worker processes so they do not hold the GIL of the serving process.
+# CPU_POOL_WORKERS=0 runs every stage in-process instead.
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+# Inputs smaller than this are cheaper to process than to send to a worker
+CPU_POOL_MIN_BYTES = int(os.getenv("CPU_POOL_MIN_BYTES", "65536"))
+
+# Workers must not be forked from a process that is already running threads
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class CpuStageError(Exception):
+    """Stands in for an exception raised in a worker that cannot be pickled"""
+
+
+def _worker_ready():
+    """No-op task used to start the worker processes ahead of the first request"""
+    return os.getpid()
+
+
+def _run_stage(fn, *args):
+    """
+    Run a stage in a worker and return ("ok", result) or ("error", exception).
+    An exception that cannot be rebuilt in the parent would break the whole
+    pool, so it is replaced by a CpuStageError carrying its message.
+    """
+    try:
+        return "ok", fn(*args)
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            e = CpuStageError(f"{type(e).__name__}: {str(e)}")
+        return "error", e
+
+
+class CpuStageExecutor:
+    """A warm process pool for CPU-bound stages, with in-process fallback"""
+
+    def __init__(self, max_workers=CPU_POOL_WORKERS, min_bytes=CPU_POOL_MIN_BYTES):
+        self.max_workers = max_workers
+        self.min_bytes = min_bytes
+        self.offloaded = 0
+        self.inline = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(START_METHOD),
+                )
+            return self._pool
+
+    def _reset_pool(self, broken=None):
+        """Shut down the pool; with broken given, only if it is still the current pool"""
+        with self._lock:
+            if broken is not None and self._pool is not broken:
+                # Another thread has already replaced the pool that broke
+                return
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """Start every worker process now so the first request does not pay for it"""
+        if self.max_workers <= 0 or self._pool is not None:
+            return
+        pool = self._get_pool()
+        try:
+            pids = {future.result() for future in [pool.submit(_worker_ready) for _ in range(self.max_workers)]}
+        except BrokenProcessPool as e:
+            logger.error(f"Could not start the CPU pool, stages will run in-process until it does: {str(e)}")
+            self._reset_pool(broken=pool)
+            return
+        logger.info(f"CPU pool ready with {len(pids)} worker processes ({START_METHOD})")
+
+    def run(self, fn, *args, deadline=None, stage="parsing", size=None):
+        """
+        Run fn(*args) in a worker process and return its result. fn must be a
+        module-level function; arguments and results are pickled, so callers
+        pass raw bytes in and get compact results back. Small inputs (size
+        below min_bytes) and a disabled or broken pool run in-process.
+        """
+        if self.max_workers <= 0 or (size is not None and size < self.min_bytes):
+            with self._lock:
+                self.inline += 1
+            return call_with_deadline(fn, *args, deadline=deadline, stage=stage)
+
+        started = time.monotonic()
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_run_stage, fn, *args)
+            status, result = future.result(timeout=request_timeout(deadline, stage=stage))
+        except TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded during {stage}")
+        except BrokenProcessPool:
+            logger.error(f"CPU pool broke during {stage}, restarting it and running in-process")
+            with self._lock:
+                self.failures += 1
+            self._reset_pool(broken=pool)
+            return call_with_deadline(fn, *args, deadline=deadline, stage=stage)
+
+        with self._lock:
+            self.offloaded += 1
+            self.busy_seconds += time.monotonic() - started
+        if status == "error":
+            raise result
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "offloaded": self.offloaded,
+                "inline": self.inline,
+                "failures": self.failures,
+                "avg_ms": self.busy_seconds / self.offloaded * 1000 if self.offloaded else 0.0,
+            }
+
+    def shutdown(self):
+        self._reset_pool()
+
+
+# Process-wide executor shared by all sessions
+cpu_executor = CpuStageExecutor()
+
+
+def run_cpu_stage(fn, *args, deadline=None, stage="parsing", size=None):
+    """Run a CPU-bound stage on the shared process pool"""
+    return cpu_executor.run(fn, *args, deadline=deadline, stage=stage, size=size)
+
+
+def warm_cpu_pool():
+    """Start the shared pool's worker processes"""
+    cpu_executor.warm_up()
+
+
+def get_cpu_pool_stats():
+    """Return how many stages ran in worker processes and how long they took"""
+    return cpu_executor.stats()
@@ -0,0 +1,155 @@
+import os
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# End-to-end budget for one request (extraction, summary and audio)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+
+# Hedging: when a call runs past the given latency percentile of its model, a
+# duplicate is sent and whichever finishes first wins. At most HEDGE_MAX_RATE
+# of calls are hedged.
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Upstream calls run on this pool so the caller can stop waiting for them
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("UPSTREAM_WORKERS", "32")))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of time"""
+
+
+class Deadline:
+    """An absolute point in time by which a request must be finished"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage="request"):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded during {stage}")
+
+    def timeout(self, cap=None, stage="request"):
+        """Timeout for one blocking call: the remaining time, optionally capped"""
+        self.check(stage)
+        remaining = self.remaining()
+        return min(remaining, cap) if cap else remaining
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def request_timeout(deadline, cap=None, stage="request"):
+    """Timeout for a call made under an optional deadline (cap alone if there is none)"""
+    return deadline.timeout(cap, stage) if deadline else cap
+
+
+def call_with_deadline(fn, *args, deadline=None, stage="request", **kwargs):
+    """
+    Run a blocking call that has no timeout of its own, giving up once the
+    deadline passes. The abandoned call finishes in the background.
+    """
+    if deadline is None:
+        return fn(*args, **kwargs)
+
+    future = _executor.submit(fn, *args, **kwargs)
+    done, _ = wait([future], timeout=deadline.timeout(stage=stage))
+    if not done:
+        future.cancel()
+        raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded during {stage}")
+    return future.result()
+
+
+class Hedger:
+    """Sends a duplicate of slow calls, capped at a fraction of all calls"""
+
+    def __init__(self, max_rate=HEDGE_MAX_RATE):
+        self.max_rate = max_rate
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _take_hedge_budget(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, fn, hedge_after, deadline=None, stage="request"):
+        """
+        Run fn(); if it has not finished after hedge_after seconds (and the
+        hedge budget allows), run it again and return whichever result comes
+        back first. Failures of one attempt are ignored while the other runs.
+        """
+        with self._lock:
+            self.calls += 1
+
+        primary = _executor.submit(fn)
+        pending = {primary}
+        timeout = request_timeout(deadline, stage=stage)
+
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done and self._take_hedge_budget():
+                logger.info(f"Hedging {stage} after {hedge_after:.2f}s")
+                pending.add(_executor.submit(fn))
+
+        error = None
+        while pending:
+            done, pending = wait(
+                pending, timeout=request_timeout(deadline, stage=stage), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded during {stage}")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+# Process-wide hedger shared by all sessions
+hedger = Hedger()
+
+
+def get_hedging_stats():
+    """Return how many calls were hedged and how many hedges won"""
+    return hedger.stats()
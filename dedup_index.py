@@ -0,0 +1,247 @@
+import os
+import logging
+import threading
+import zlib
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# MinHash parameters. Signatures are NUM_PERMUTATIONS uint32 values (512 bytes
+# per document) and estimate the Jaccard similarity of word shingles.
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 5
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.85"))
+DEDUP_INDEX_CAPACITY = int(os.getenv("DEDUP_INDEX_CAPACITY", "5000"))
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_SHINGLE_BASE = np.uint64(1000003)
+_BLOCK_SIZE = 4096
+
+# Fixed seed so signatures stay comparable for the lifetime of the index
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2**32, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def _shingle_hashes(text):
+    """Hash every SHINGLE_SIZE-word window of the text to a 32-bit value"""
+    words = text.lower().split()
+    if not words:
+        return np.zeros(1, dtype=np.uint64)
+
+    word_hashes = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+    size = min(SHINGLE_SIZE, len(words))
+    windows = len(words) - size + 1
+
+    # Polynomial combination of consecutive word hashes, all windows at once
+    shingles = np.zeros(windows, dtype=np.uint64)
+    for offset in range(size):
+        shingles = (shingles * _SHINGLE_BASE + word_hashes[offset : offset + windows]) & _MASK32
+    return np.unique(shingles)
+
+
+def content_signature(text):
+    """Compute the MinHash signature of a document"""
+    shingles = _shingle_hashes(text)
+    signature = np.full(NUM_PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint64)
+
+    for start in range(0, len(shingles), _BLOCK_SIZE):
+        block = shingles[start : start + _BLOCK_SIZE]
+        hashed = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) & _MASK32
+        np.minimum(signature, hashed.min(axis=1), out=signature)
+
+    return signature.astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Fixed-capacity MinHash index mapping documents to the summaries and audio
+    generated for them. When full, the oldest document is overwritten.
+    """
+
+    def __init__(self, threshold=DEDUP_SIMILARITY_THRESHOLD, capacity=DEDUP_INDEX_CAPACITY):
+        self.threshold = threshold
+        self.capacity = capacity
+        self._signatures = np.zeros((capacity, NUM_PERMUTATIONS), dtype=np.uint32)
+        self._payloads = [None] * capacity
+        self._doc_ids = np.full(capacity, -1, dtype=np.int64)
+        self._next_doc_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.refreshes = 0
+
+    def _row(self, doc_id):
+        row = doc_id % self.capacity
+        return row if self._doc_ids[row] == doc_id else None
+
+    def _similar_rows(self, signature):
+        """(similarity, row) of the rows at or above the threshold, most similar (then newest) first"""
+        filled = min(self._next_doc_id, self.capacity)
+        if not filled:
+            return []
+        similarities = (self._signatures[:filled] == signature).mean(axis=1)
+        rows = np.flatnonzero(similarities >= self.threshold)
+        return sorted(
+            ((float(similarities[row]), int(row)) for row in rows),
+            key=lambda match: (match[0], self._doc_ids[match[1]]),
+            reverse=True,
+        )
+
+    @staticmethod
+    def _is_other_version(payload, canonical_url, section_hashes):
+        """Whether a payload is for a different version of the same page"""
+        return (
+            bool(canonical_url)
+            and payload["canonical_url"] == canonical_url
+            and section_hashes is not None
+            and payload["section_hashes"] != tuple(section_hashes)
+        )
+
+    def find(self, signature, summary_type, audio_key=None, canonical_url=None, section_hashes=None):
+        """
+        Find the most similar indexed document that already has a summary of
+        this type. Returns a dict with doc_id, similarity, summary_data and
+        audio_data (None if no usable audio for audio_key), or None if nothing
+        is similar enough.
+
+        A match with the same canonical_url but different section_hashes is an
+        earlier version of a page that has since changed (a correction or an
+        appended update), so it is not reused; the new version is summarized,
+        re-running only its changed sections.
+        """
+        audio_key = audio_key or summary_type
+        with self._lock:
+            self.lookups += 1
+            changed_version = False
+            for similarity, row in self._similar_rows(signature):
+                payload = self._payloads[row]
+                if summary_type not in payload["summaries"]:
+                    continue
+                if self._is_other_version(payload, canonical_url, section_hashes):
+                    changed_version = True
+                    continue
+                break
+            else:
+                if changed_version:
+                    self.refreshes += 1
+                return None
+
+            self.hits += 1
+            audio_data = payload["audio"].get(audio_key)
+            if audio_data and not os.path.exists(audio_data["audio_path"]):
+                # Audio files are cleaned up periodically, only the summary is reusable
+                del payload["audio"][audio_key]
+                audio_data = None
+
+            return {
+                "doc_id": int(self._doc_ids[row]),
+                "similarity": similarity,
+                "summary_data": dict(payload["summaries"][summary_type]),
+                "audio_data": dict(audio_data) if audio_data else None,
+            }
+
+    def add_summary(
+        self, signature, summary_type, summary_data, doc_id=None, canonical_url=None, section_hashes=None
+    ):
+        """
+        Record a summary for a document, returning the document's id. Without
+        a doc_id, the summary is attached to an indexed document similar
+        enough and with the same canonical_url and section_hashes, if any, so
+        every summary type of one page lives in one row.
+        """
+        with self._lock:
+            row = self._row(doc_id) if doc_id is not None else None
+            if row is None and canonical_url and section_hashes is not None:
+                for _, candidate in self._similar_rows(signature):
+                    payload = self._payloads[candidate]
+                    if payload["canonical_url"] == canonical_url and payload["section_hashes"] == tuple(
+                        section_hashes
+                    ):
+                        row = candidate
+                        doc_id = int(self._doc_ids[row])
+                        break
+            if row is None:
+                doc_id = self._next_doc_id
+                self._next_doc_id += 1
+                row = doc_id % self.capacity
+                self._signatures[row] = signature
+                self._doc_ids[row] = doc_id
+                self._payloads[row] = {
+                    "summaries": {},
+                    "audio": {},
+                    "canonical_url": canonical_url,
+                    "section_hashes": tuple(section_hashes) if section_hashes is not None else None,
+                }
+
+            self._payloads[row]["summaries"][summary_type] = dict(summary_data)
+            return doc_id
+
+    def add_audio(self, doc_id, audio_key, audio_data):
+        """Record the audio generated for a document's summary under audio_key"""
+        with self._lock:
+            row = self._row(doc_id)
+            if row is not None:
+                self._payloads[row]["audio"][audio_key] = dict(audio_data)
+
+    def stats(self):
+        """Return lookup/hit counters and the hit rate"""
+        with self._lock:
+            return {
+                "documents": min(self._next_doc_id, self.capacity),
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+
+# Process-wide index shared by all sessions
+dedup_index = NearDuplicateIndex()
+
+
+def find_duplicate(signature, summary_type, audio_key=None, canonical_url=None, section_hashes=None):
+    """Look up a previously summarized near-duplicate of a document"""
+    match = dedup_index.find(
+        signature,
+        summary_type,
+        audio_key=audio_key,
+        canonical_url=canonical_url,
+        section_hashes=section_hashes,
+    )
+    if match:
+        logger.info(
+            f"Reusing summary of near-duplicate document {match['doc_id']} "
+            f"(similarity {match['similarity']:.2f})"
+        )
+    return match
+
+
+def remember_summary(signature, summary_type, summary_data, doc_id=None, canonical_url=None, section_hashes=None):
+    """Index a freshly generated summary so near-duplicates can reuse it"""
+    return dedup_index.add_summary(
+        signature,
+        summary_type,
+        summary_data,
+        doc_id=doc_id,
+        canonical_url=canonical_url,
+        section_hashes=section_hashes,
+    )
+
+
+def remember_audio(doc_id, audio_key, audio_data):
+    """Attach generated audio to an indexed document"""
+    dedup_index.add_audio(doc_id, audio_key, audio_data)
+
+
+def get_dedup_stats():
+    """Return the near-duplicate index statistics"""
+    return dedup_index.stats()
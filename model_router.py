@@ -0,0 +1,280 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from deadlines import (
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    HEDGING_ENABLED,
+    DeadlineExceeded,
+    hedger,
+    percentile,
+    request_timeout,
+)
+from output_budgets import load_output_budgets
+from text_segmenter import approximate_token_count
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model per task (summary type, "section_notes" or "audio_summary"), chosen by
+# input size: the first route whose max_input_tokens fits the input wins, and
+# a max_input_tokens of None matches any size.
+DEFAULT_MODEL_ROUTES = {
+    "quick": [
+        {"max_input_tokens": 16000, "model": "gpt-4o-mini"},
+        {"max_input_tokens": None, "model": "gpt-4o"},
+    ],
+    "deep_dive": [{"max_input_tokens": None, "model": "gpt-4o"}],
+    "key_quotes": [
+        {"max_input_tokens": 16000, "model": "gpt-4o-mini"},
+        {"max_input_tokens": None, "model": "gpt-4o"},
+    ],
+    "key_principles": [{"max_input_tokens": None, "model": "gpt-4o"}],
+    "section_notes": [{"max_input_tokens": None, "model": "gpt-4o-mini"}],
+    "audio_summary": [{"max_input_tokens": None, "model": "gpt-4o-mini"}],
+}
+
+# Where to send a model's traffic while it is unhealthy
+DEFAULT_FALLBACK_MODELS = {
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4o-mini": "gpt-4o",
+}
+
+# Health thresholds over the most recent calls of each model and task. Calls
+# older than the window age are forgotten, so a failed-over model is retried
+# once its bad samples expire. Latency is judged per task, since a long
+# deep_dive and a short quick summary on one model take very different times:
+# a summary type fails over when its p95 misses the type's latency SLO (see
+# output_budgets), other tasks when it exceeds MODEL_P95_LATENCY_THRESHOLD_S.
+LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "50"))
+LATENCY_WINDOW_SECONDS = float(os.getenv("MODEL_LATENCY_WINDOW_S", "300"))
+LATENCY_MIN_SAMPLES = int(os.getenv("MODEL_LATENCY_MIN_SAMPLES", "5"))
+P95_LATENCY_THRESHOLD = float(os.getenv("MODEL_P95_LATENCY_THRESHOLD_S", "60"))
+ERROR_RATE_THRESHOLD = float(os.getenv("MODEL_ERROR_RATE_THRESHOLD", "0.25"))
+
+
+def load_model_routes():
+    """
+    Load the routing table from MODEL_ROUTES_FILE (a JSON file with "routes"
+    and optional "fallbacks" keys), falling back to the defaults.
+    """
+    routes_file = os.getenv("MODEL_ROUTES_FILE")
+    if not routes_file:
+        return DEFAULT_MODEL_ROUTES, DEFAULT_FALLBACK_MODELS
+
+    with open(routes_file) as f:
+        config = json.load(f)
+    return (
+        {**DEFAULT_MODEL_ROUTES, **config.get("routes", {})},
+        {**DEFAULT_FALLBACK_MODELS, **config.get("fallbacks", {})},
+    )
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for routing"""
+    return approximate_token_count(text)
+
+
+class ModelRouter:
+    """
+    Picks a model per (task, input tokens) from a routing table and keeps a
+    rolling window of latency and errors per model and task. A model whose
+    error rate, or whose p95 latency on a task, crosses its threshold has that
+    task's traffic sent to its fallback.
+    """
+
+    def __init__(self, routes=None, fallbacks=None, latency_thresholds=None):
+        default_routes, default_fallbacks = load_model_routes()
+        self.routes = routes or default_routes
+        self.fallbacks = fallbacks or default_fallbacks
+        self.latency_thresholds = (
+            latency_thresholds if latency_thresholds is not None else load_output_budgets()[1]
+        )
+        self._calls = {}  # (model, task) -> deque of (timestamp, latency seconds, succeeded)
+        self._lock = threading.Lock()
+
+    def record(self, model, task, latency, succeeded):
+        """Record the outcome of one call"""
+        with self._lock:
+            calls = self._calls.setdefault((model, task), deque(maxlen=LATENCY_WINDOW))
+            calls.append((time.monotonic(), latency, succeeded))
+
+    def _recent_calls(self, model, task=None):
+        """(latency, succeeded) of the model's calls in the window, for one task or all of them"""
+        cutoff = time.monotonic() - LATENCY_WINDOW_SECONDS
+        with self._lock:
+            return [
+                call[1:]
+                for (call_model, call_task), calls in self._calls.items()
+                if call_model == model and (task is None or call_task == task)
+                for call in calls
+                if call[0] >= cutoff
+            ]
+
+    def _tasks(self, model):
+        with self._lock:
+            return [task for call_model, task in self._calls if call_model == model]
+
+    def latency_threshold(self, task):
+        """p95 latency above which a task's traffic leaves a model"""
+        return self.latency_thresholds.get(task, P95_LATENCY_THRESHOLD)
+
+    def model_stats(self, model, task=None):
+        """Rolling call count, p50/p95 latency and error rate for a model (on one task)"""
+        calls = self._recent_calls(model, task)
+        latencies = [latency for latency, succeeded in calls if succeeded]
+        errors = sum(1 for _, succeeded in calls if not succeeded)
+        return {
+            "calls": len(calls),
+            "p50_latency": percentile(latencies, 0.50),
+            "p95_latency": percentile(latencies, 0.95),
+            "error_rate": errors / len(calls) if calls else 0.0,
+        }
+
+    def hedge_delay(self, model, task):
+        """Latency after which a call to this model for this task is hedged (None until enough samples)"""
+        latencies = [latency for latency, succeeded in self._recent_calls(model, task) if succeeded]
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(latencies, HEDGE_PERCENTILE)
+
+    def _is_fast_enough(self, model, task):
+        stats = self.model_stats(model, task)
+        if stats["calls"] < LATENCY_MIN_SAMPLES or stats["p95_latency"] is None:
+            return True
+        return stats["p95_latency"] <= self.latency_threshold(task)
+
+    def is_healthy(self, model, task=None):
+        """
+        Whether a model is within its error threshold and its latency threshold
+        for the task (for every task it has served when task is None)
+        """
+        stats = self.model_stats(model)
+        if stats["calls"] >= LATENCY_MIN_SAMPLES and stats["error_rate"] > ERROR_RATE_THRESHOLD:
+            return False
+        tasks = [task] if task is not None else self._tasks(model)
+        return all(self._is_fast_enough(model, task) for task in tasks)
+
+    def primary_model(self, task, input_tokens):
+        """The model the routing table assigns to a task and input size"""
+        routes = self.routes.get(task) or self.routes["deep_dive"]
+        for route in routes:
+            if route["max_input_tokens"] is None or input_tokens <= route["max_input_tokens"]:
+                return route["model"]
+        return routes[-1]["model"]
+
+    def choose_model(self, task, input_tokens):
+        """Pick the model for a call, failing over if the primary is unhealthy for the task"""
+        model = self.primary_model(task, input_tokens)
+        fallback = self.fallbacks.get(model)
+        if not self.is_healthy(model, task) and fallback and self.is_healthy(fallback, task):
+            logger.warning(f"Model {model} is unhealthy for {task}, routing it to {fallback}")
+            return fallback
+        return model
+
+    def stats(self):
+        """Stats for every model that has been called, overall and per task"""
+        with self._lock:
+            models = list(dict.fromkeys(model for model, _ in self._calls))
+        return {
+            model: {
+                **self.model_stats(model),
+                "healthy": self.is_healthy(model),
+                "tasks": {
+                    task: {
+                        **self.model_stats(model, task),
+                        "threshold": self.latency_threshold(task),
+                        "healthy": self.is_healthy(model, task),
+                    }
+                    for task in self._tasks(model)
+                },
+            }
+            for model in models
+        }
+
+
+# Process-wide router shared by all sessions
+model_router = ModelRouter()
+
+
+def call_upstream(model, request, deadline=None, stage="request", hedge=True, router=None):
+    """
+    Run an upstream API call, hedging it when hedging is enabled and the call
+    runs past the model's usual latency for this stage (task), as recorded by
+    router (the chat-model router by default).
+    """
+    if HEDGING_ENABLED and hedge:
+        hedge_after = (router or model_router).hedge_delay(model, stage)
+        return hedger.call(request, hedge_after, deadline=deadline, stage=stage)
+    return request()
+
+
+def _recorded_stream(stream, model, task, started):
+    """
+    Yield the chunks of a streamed completion and record the call once the
+    stream ends, so its latency covers the whole generation. A stream that
+    fails, or is abandoned before its end, is recorded as a failed call.
+    """
+    succeeded = False
+    try:
+        yield from stream
+        succeeded = True
+    finally:
+        model_router.record(model, task, time.monotonic() - started, succeeded)
+
+
+def routed_completion(client, task, input_text, deadline=None, **kwargs):
+    """
+    Create a chat completion on the model routed for this task and input.
+    If the call fails it is retried once on the fallback model, time
+    permitting. Returns the response and the model that produced it.
+    With stream=True the response is an iterator of chunks, and the call is
+    only recorded in the model's stats once it has been consumed.
+    """
+    model = model_router.choose_model(task, estimate_tokens(input_text))
+    candidates = [model]
+    if model_router.fallbacks.get(model):
+        candidates.append(model_router.fallbacks[model])
+
+    for attempt, candidate in enumerate(candidates):
+        started = time.monotonic()
+        try:
+            if deadline:
+                # The client's own retries would not respect the deadline
+                call_client = client.with_options(
+                    timeout=request_timeout(deadline, stage=task), max_retries=0
+                )
+            else:
+                call_client = client
+            response = call_upstream(
+                candidate,
+                lambda: call_client.chat.completions.create(model=candidate, **kwargs),
+                deadline=deadline,
+                stage=task,
+                # A stream is consumed by the caller, so a duplicate could not be raced
+                hedge=not kwargs.get("stream"),
+            )
+        except DeadlineExceeded:
+            model_router.record(candidate, task, time.monotonic() - started, False)
+            raise
+        except Exception as e:
+            model_router.record(candidate, task, time.monotonic() - started, False)
+            if attempt == len(candidates) - 1:
+                raise
+            logger.warning(f"Call to {candidate} failed ({str(e)}), retrying on {candidates[attempt + 1]}")
+            continue
+
+        if kwargs.get("stream"):
+            return _recorded_stream(response, candidate, task, started), candidate
+        model_router.record(candidate, task, time.monotonic() - started, True)
+        return response, candidate
+
+
+def get_model_stats():
+    """Return rolling latency and error stats per model"""
+    return model_router.stats()
@@ -0,0 +1,170 @@
+import os
+import json
+import logging
+import threading
+from collections import deque
+
+from deadlines import percentile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output tokens each summary type may generate, and the p95 latency (seconds)
+# it should stay under. Override with a JSON OUTPUT_BUDGETS_FILE containing
+# "budgets" and/or "slo_seconds".
+DEFAULT_OUTPUT_BUDGETS = {
+    "quick": 800,
+    "deep_dive": 3000,
+    "key_quotes": 1500,
+    "key_principles": 1500,
+}
+DEFAULT_LATENCY_SLOS = {
+    "quick": 20.0,
+    "deep_dive": 90.0,
+    "key_quotes": 45.0,
+    "key_principles": 45.0,
+}
+
+# Samples kept per type for the stats, and needed before each adjustment
+OUTPUT_BUDGET_WINDOW = int(os.getenv("OUTPUT_BUDGET_WINDOW", "100"))
+OUTPUT_BUDGET_MIN_SAMPLES = int(os.getenv("OUTPUT_BUDGET_MIN_SAMPLES", "10"))
+# A type missing its SLO has its budget multiplied by TIGHTEN_FACTOR (never
+# below MIN_FRACTION of the configured budget); one well under its SLO
+# (p95 below RELAX_BELOW x SLO) is relaxed back towards the configured budget
+OUTPUT_BUDGET_TIGHTEN_FACTOR = float(os.getenv("OUTPUT_BUDGET_TIGHTEN_FACTOR", "0.8"))
+OUTPUT_BUDGET_RELAX_FACTOR = float(os.getenv("OUTPUT_BUDGET_RELAX_FACTOR", "1.1"))
+OUTPUT_BUDGET_RELAX_BELOW = float(os.getenv("OUTPUT_BUDGET_RELAX_BELOW", "0.7"))
+OUTPUT_BUDGET_MIN_FRACTION = float(os.getenv("OUTPUT_BUDGET_MIN_FRACTION", "0.25"))
+
+# Words per token, for telling the model how long it may write
+WORDS_PER_TOKEN = 0.75
+# Tokens of JSON wrapping around the summary text
+JSON_OVERHEAD_TOKENS = 60
+
+
+def load_output_budgets():
+    """Return (budgets, slo_seconds) from the defaults and OUTPUT_BUDGETS_FILE"""
+    budgets_file = os.getenv("OUTPUT_BUDGETS_FILE")
+    if not budgets_file:
+        return dict(DEFAULT_OUTPUT_BUDGETS), dict(DEFAULT_LATENCY_SLOS)
+
+    with open(budgets_file) as f:
+        config = json.load(f)
+    return (
+        {**DEFAULT_OUTPUT_BUDGETS, **config.get("budgets", {})},
+        {**DEFAULT_LATENCY_SLOS, **config.get("slo_seconds", {})},
+    )
+
+
+class OutputBudgetController:
+    """
+    Keeps an output token budget per summary type and adapts it to the
+    type's latency SLO: when the p95 latency of the completions since the
+    last adjustment misses the SLO the budget is tightened, and when it is
+    comfortably met the budget is relaxed back towards its configured value.
+    """
+
+    def __init__(self, budgets=None, slo_seconds=None):
+        if budgets is None or slo_seconds is None:
+            default_budgets, default_slos = load_output_budgets()
+            budgets = budgets or default_budgets
+            slo_seconds = slo_seconds or default_slos
+        self.configured = dict(budgets)
+        self.budgets = dict(budgets)
+        self.slo_seconds = dict(slo_seconds)
+        self._history = {}
+        self._since_adjustment = {}
+        self._adjustments = {}
+        self._lock = threading.Lock()
+
+    def budget(self, summary_type):
+        """Current output token budget for a summary type (None if it has none)"""
+        with self._lock:
+            return self.budgets.get(summary_type)
+
+    def max_tokens(self, summary_type):
+        """max_tokens for the API call: the budget plus room for the JSON wrapping"""
+        budget = self.budget(summary_type)
+        return budget + JSON_OVERHEAD_TOKENS if budget else None
+
+    def length_instruction(self, summary_type):
+        """Prompt line telling the model how long the summary may be"""
+        budget = self.budget(summary_type)
+        if not budget:
+            return ""
+        words = int(budget * WORDS_PER_TOKEN / 10) * 10
+        return f"\n\nKeep the summary under {words} words so the response is complete."
+
+    def record(self, summary_type, latency_seconds, completion_tokens, truncated=False, estimated=False):
+        """Record one completion and adjust the type's budget if needed"""
+        with self._lock:
+            if summary_type not in self.budgets:
+                return
+            sample = {
+                "latency": latency_seconds,
+                "completion_tokens": completion_tokens,
+                "budget": self.budgets[summary_type],
+                "truncated": truncated,
+                "estimated": estimated,
+            }
+            self._history.setdefault(summary_type, deque(maxlen=OUTPUT_BUDGET_WINDOW)).append(sample)
+            recent = self._since_adjustment.setdefault(summary_type, [])
+            recent.append(latency_seconds)
+            if len(recent) >= OUTPUT_BUDGET_MIN_SAMPLES:
+                self._adjust(summary_type, percentile(recent, 0.95))
+
+    def _adjust(self, summary_type, p95):
+        budget = self.budgets[summary_type]
+        configured = self.configured[summary_type]
+        slo = self.slo_seconds.get(summary_type)
+        if not slo:
+            return
+
+        if p95 > slo:
+            new_budget = max(int(configured * OUTPUT_BUDGET_MIN_FRACTION), int(budget * OUTPUT_BUDGET_TIGHTEN_FACTOR))
+        elif p95 < slo * OUTPUT_BUDGET_RELAX_BELOW:
+            new_budget = min(configured, int(budget * OUTPUT_BUDGET_RELAX_FACTOR))
+        else:
+            new_budget = budget
+
+        # Judge the next budget only on completions made under it
+        self._since_adjustment[summary_type] = []
+        if new_budget != budget:
+            logger.info(
+                f"{summary_type} p95 latency {p95:.1f}s vs SLO {slo:.0f}s, "
+                f"output budget {budget} -> {new_budget} tokens"
+            )
+            self.budgets[summary_type] = new_budget
+            self._adjustments[summary_type] = self._adjustments.get(summary_type, 0) + 1
+
+    def stats(self):
+        """Per type: budget, SLO and the latency/length of recent completions"""
+        with self._lock:
+            stats = {}
+            for summary_type, history in self._history.items():
+                latencies = [sample["latency"] for sample in history]
+                tokens = [sample["completion_tokens"] for sample in history]
+                stats[summary_type] = {
+                    "budget": self.budgets[summary_type],
+                    "configured_budget": self.configured[summary_type],
+                    "slo_seconds": self.slo_seconds.get(summary_type),
+                    "samples": len(history),
+                    "p50_latency": percentile(latencies, 0.5),
+                    "p95_latency": percentile(latencies, 0.95),
+                    "p50_completion_tokens": percentile(tokens, 0.5),
+                    "p95_completion_tokens": percentile(tokens, 0.95),
+                    "truncated": sum(1 for sample in history if sample["truncated"]),
+                    "estimated": sum(1 for sample in history if sample["estimated"]),
+                    "adjustments": self._adjustments.get(summary_type, 0),
+                }
+            return stats
+
+
+# Process-wide controller shared by all sessions
+output_budgets = OutputBudgetController()
+
+
+def get_output_budget_stats():
+    """Return the output budget and latency/length stats per summary type"""
+    return output_budgets.stats()
@@ -0,0 +1,231 @@
+import os
+import cProfile
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from slugify import slugify
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Profile a sample of all requests, or a single request with ?profile=1
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_QUERY_PARAM = "profile"
+PROFILES_DIR = os.getenv("PROFILES_DIR", "profiles")
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))
+
+# Stack paths below this fraction of the request's time are left out of the
+# collapsed stacks to keep the file (and the flame graph) readable
+MIN_STACK_FRACTION = 0.0005
+MAX_STACK_DEPTH = 200
+
+# tracemalloc is process-wide, so concurrent profiled requests share one trace
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def should_profile(query_params=None):
+    """Decide whether to profile a request (query_params as returned by Streamlit)"""
+    requested = (query_params or {}).get(PROFILE_QUERY_PARAM, [""])[0].lower()
+    if requested in ("1", "true", "yes"):
+        return True
+    return PROFILING_ENABLED and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_started = True
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+
+def frame_label(func):
+    """Name a pstats function key (file, line, name) for a stack frame"""
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats):
+    """
+    Build collapsed stacks ("a;b;c microseconds") from a pstats caller graph.
+    cProfile keeps only caller/callee pairs, so a function's time is split
+    between its call paths in proportion to the time each caller spent in it.
+    """
+    entries = stats.stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    roots = [func for func, entry in entries.items() if not entry[4]]
+    total = sum(entries[func][3] for func in roots)
+    min_seconds = total * MIN_STACK_FRACTION
+    stacks = defaultdict(float)
+
+    def walk(func, path, on_path, path_seconds):
+        _, _, own_seconds, cumulative_seconds, _ = entries[func]
+        scale = path_seconds / cumulative_seconds if cumulative_seconds else 0.0
+        path = path + [frame_label(func)]
+        key = ";".join(path)
+        stacks[key] += own_seconds * scale
+
+        for callee, edge_seconds in callees[func].items():
+            child_seconds = edge_seconds * scale
+            if callee in on_path or len(path) >= MAX_STACK_DEPTH:
+                # Recursion is folded into the caller
+                stacks[key] += child_seconds
+            elif child_seconds >= min_seconds:
+                walk(callee, path, on_path | {callee}, child_seconds)
+
+    for root in roots:
+        if entries[root][3] >= min_seconds:
+            walk(root, [], {root}, entries[root][3])
+
+    return {stack: int(seconds * 1_000_000) for stack, seconds in stacks.items() if seconds >= 1e-6}
+
+
+class _NullProfiler:
+    """Stands in for RequestProfiler when profiling is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def stage(self, name):
+        return nullcontext()
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+class RequestProfiler:
+    """
+    Profiles one pipeline run with cProfile and tracemalloc and writes a
+    collapsed-stack file, a top-allocations report and a JSON summary with
+    the URL and stage timings. Only the calling thread is profiled; time
+    spent in worker threads and processes shows up as waiting in the stage
+    that started it.
+    """
+
+    def __init__(self, url, label="request", output_dir=PROFILES_DIR):
+        self.url = url
+        self.label = label
+        self.output_dir = output_dir
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a named stage of the run"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.monotonic() - started
+
+    def __enter__(self):
+        self.started_at = datetime.now()
+        self.started = time.monotonic()
+        _start_tracemalloc()
+        self.baseline = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.profiler.disable()
+        total_seconds = time.monotonic() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        _stop_tracemalloc()
+
+        try:
+            self.write_reports(snapshot, peak_bytes, total_seconds)
+        except Exception as e:
+            # Profiling must never fail the request it observes
+            logger.error(f"Error writing profile for {self.url}: {str(e)}")
+        return False
+
+    def write_reports(self, snapshot, peak_bytes, total_seconds):
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = self.started_at.strftime("%Y%m%d_%H%M%S")
+        base_path = os.path.join(
+            self.output_dir, f"{timestamp}_{self.label}_{slugify(self.url)[:60]}_{os.urandom(2).hex()}"
+        )
+
+        stacks = collapsed_stacks(pstats.Stats(self.profiler))
+        with open(f"{base_path}.collapsed", "w") as f:
+            for stack, microseconds in sorted(stacks.items()):
+                f.write(f"{stack} {microseconds}\n")
+
+        ignored = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        allocations = snapshot.filter_traces(ignored).compare_to(
+            self.baseline.filter_traces(ignored), "lineno"
+        )[:PROFILE_TOP_ALLOCATIONS]
+        stage_summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+        with open(f"{base_path}.allocations.txt", "w") as f:
+            f.write(f"URL: {self.url}\n")
+            f.write(f"Started: {self.started_at.isoformat()} ({self.label})\n")
+            f.write(f"Total: {total_seconds:.2f}s; stages: {stage_summary or 'none'}\n")
+            f.write(f"Peak traced memory: {peak_bytes / 1024 / 1024:.1f} MB\n")
+            f.write("Top allocations still held at the end of the run, by line ")
+            f.write("(tracing is process-wide, so other sessions' allocations are included):\n\n")
+            for index, stat in enumerate(allocations, start=1):
+                frame = stat.traceback[0]
+                f.write(
+                    f"{index:>3}. {frame.filename}:{frame.lineno}: {stat.size_diff / 1024:+.1f} KiB "
+                    f"({stat.count_diff:+d} blocks, {stat.size / 1024:.1f} KiB total)\n"
+                )
+
+        with open(f"{base_path}.json", "w") as f:
+            json.dump(
+                {
+                    "url": self.url,
+                    "label": self.label,
+                    "started_at": self.started_at.isoformat(),
+                    "total_seconds": round(total_seconds, 4),
+                    "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+                    "peak_traced_bytes": peak_bytes,
+                    "collapsed_stacks": f"{base_path}.collapsed",
+                    "allocations": f"{base_path}.allocations.txt",
+                },
+                f,
+                indent=2,
+            )
+        logger.info(f"Wrote profile of {self.url} to {base_path}.* (total {total_seconds:.2f}s; {stage_summary})")
+
+
+def profile_request(url, enabled, label="request", output_dir=PROFILES_DIR):
+    """Return a profiler for one pipeline run, or a no-op stand-in when disabled"""
+    if not enabled:
+        return NULL_PROFILER
+    return RequestProfiler(url, label, output_dir)
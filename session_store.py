@@ -0,0 +1,164 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_DIR = os.getenv(
+    "SESSION_STORE_DIR", os.path.join(tempfile.gettempdir(), "smart_summarizer_sessions")
+)
+# Total bytes of session payloads kept in memory across all sessions of the process
+SESSION_MEMORY_BUDGET = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "64")) * 1024 * 1024
+# Payloads larger than this are written straight to disk
+SESSION_SPILL_THRESHOLD = int(os.getenv("SESSION_SPILL_THRESHOLD_KB", "256")) * 1024
+
+
+class SessionStore:
+    """
+    Holds large per-session payloads (content, summaries, playlist results)
+    outside of st.session_state, which only keeps the string handles.
+
+    Small payloads stay in memory until the process-wide budget is exceeded,
+    at which point the least recently used ones are spilled to disk. Large
+    payloads go to disk directly.
+    """
+
+    def __init__(self, root=SESSION_STORE_DIR, memory_budget=SESSION_MEMORY_BUDGET):
+        self.root = Path(root)
+        self.memory_budget = memory_budget
+        self._memory = OrderedDict()  # handle -> (encoded payload, size)
+        self._disk = {}  # handle -> size
+        self._memory_bytes = 0
+        self._last_used = {}  # session id -> time it last stored or loaded a payload
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, handle):
+        session_id, key = handle.split(":", 1)
+        return self.root / session_id / f"{key}.json"
+
+    def _spill(self, handle, encoded):
+        path = self._path(handle)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(encoded)
+        self._disk[handle] = len(encoded)
+
+    def put(self, session_id, value):
+        """Store a JSON-serializable payload and return its handle"""
+        handle = f"{session_id}:{uuid.uuid4().hex}"
+        encoded = json.dumps(value).encode("utf-8")
+
+        with self._lock:
+            self._last_used[session_id] = time.time()
+            if len(encoded) > SESSION_SPILL_THRESHOLD:
+                self._spill(handle, encoded)
+                return handle
+
+            self._memory[handle] = (encoded, len(encoded))
+            self._memory_bytes += len(encoded)
+
+            while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+                old_handle, (old_encoded, old_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= old_size
+                self._spill(old_handle, old_encoded)
+                logger.info(f"Spilled session payload {old_handle} ({old_size} bytes) to disk")
+
+        return handle
+
+    def get(self, handle):
+        """Load the payload for a handle (None if it no longer exists)"""
+        if not handle:
+            return None
+
+        with self._lock:
+            self._last_used[handle.split(":", 1)[0]] = time.time()
+            if handle in self._memory:
+                self._memory.move_to_end(handle)
+                return json.loads(self._memory[handle][0])
+
+        try:
+            with open(self._path(handle), "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, handle):
+        """Remove a payload"""
+        if not handle:
+            return
+
+        with self._lock:
+            if handle in self._memory:
+                self._memory_bytes -= self._memory.pop(handle)[1]
+            if self._disk.pop(handle, None) is not None:
+                self._path(handle).unlink(missing_ok=True)
+
+    def replace(self, session_id, handle, value):
+        """Store a new payload in place of an old one and return the new handle"""
+        self.delete(handle)
+        return self.put(session_id, value) if value is not None else None
+
+    def footprint(self, session_id=None):
+        """Bytes held in memory and on disk, for one session or the whole process"""
+        prefix = f"{session_id}:" if session_id else ""
+        with self._lock:
+            memory_items = [size for h, (_, size) in self._memory.items() if h.startswith(prefix)]
+            disk_items = [size for h, size in self._disk.items() if h.startswith(prefix)]
+        return {
+            "memory_bytes": sum(memory_items),
+            "disk_bytes": sum(disk_items),
+            "items": len(memory_items) + len(disk_items),
+        }
+
+    def drop_session(self, session_id):
+        """Remove every payload of a session"""
+        prefix = f"{session_id}:"
+        with self._lock:
+            self._last_used.pop(session_id, None)
+            for handle in [h for h in self._memory if h.startswith(prefix)]:
+                self._memory_bytes -= self._memory.pop(handle)[1]
+            for handle in [h for h in self._disk if h.startswith(prefix)]:
+                del self._disk[handle]
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+
+    def expire(self, max_age_seconds):
+        """Drop the payloads of sessions that have not stored or loaded anything recently"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            idle = {s for s, last_used in self._last_used.items() if last_used < cutoff}
+            active = set(self._last_used) - idle
+
+        # Directories left behind by earlier processes are expired by age too
+        for session_dir in self.root.iterdir():
+            try:
+                if session_dir.name not in active and session_dir.stat().st_mtime < cutoff:
+                    idle.add(session_dir.name)
+            except FileNotFoundError:
+                continue
+
+        for session_id in idle:
+            self.drop_session(session_id)
+            logger.info(f"Expired payloads of idle session {session_id}")
+
+
+def read_audio(file_path):
+    """
+    Read an audio file in a single call. The player and the download button
+    are given the same bytes object, so the file is held in memory once per
+    render.
+    """
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+# Process-wide store shared by all sessions
+session_store = SessionStore()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import logging
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_generator import generate_audio, normalize_audio_settings, save_audio, synthesize_speech
+from deadlines import request_timeout
+from summarizer import generate_summary
+from text_segmenter import sentence_boundaries
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Concurrent TTS calls per pipeline run
+TTS_PIPELINE_WORKERS = int(os.getenv("TTS_PIPELINE_WORKERS", "4"))
+# The first segment is short so speech synthesis starts early; later segments
+# double in size up to the maximum to keep the number of TTS calls down
+FIRST_SEGMENT_CHARS = int(os.getenv("TTS_FIRST_SEGMENT_CHARS", "200"))
+MAX_SEGMENT_CHARS = int(os.getenv("TTS_MAX_SEGMENT_CHARS", "1500"))
+
+# Formats whose encoded segments can be joined byte-for-byte
+CONCATENABLE_FORMATS = {"mp3", "aac"}
+
+
+class SentenceBatcher:
+    """Cuts streamed text into TTS-sized segments at sentence boundaries"""
+
+    def __init__(self, first_segment_chars=FIRST_SEGMENT_CHARS, max_segment_chars=MAX_SEGMENT_CHARS):
+        self.max_segment_chars = max_segment_chars
+        self._target = first_segment_chars
+        self._buffer = ""
+
+    def _cut(self):
+        if len(self._buffer) < self._target:
+            return None
+
+        window_end = min(len(self._buffer), self.max_segment_chars)
+        for boundary in sentence_boundaries(self._buffer, 0, window_end):
+            if boundary >= self._target:
+                return boundary
+
+        if len(self._buffer) < self.max_segment_chars:
+            return None
+        # No sentence boundary within the limit, cut at the last space instead
+        cut = self._buffer.rfind(" ", 0, self.max_segment_chars)
+        return cut if cut > 0 else self.max_segment_chars
+
+    def feed(self, text):
+        """Add streamed text and return the segments that are now complete"""
+        self._buffer += text
+        segments = []
+        cut = self._cut()
+        while cut:
+            segment = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if segment:
+                segments.append(segment)
+            self._target = min(self._target * 2, self.max_segment_chars)
+            cut = self._cut()
+        return segments
+
+    def flush(self):
+        """Return whatever text is left as the final segment"""
+        segment = self._buffer.strip()
+        self._buffer = ""
+        return [segment] if segment else []
+
+
+def concatenate_audio(segments, audio_format):
+    """Join encoded audio segments into one stream of the same format"""
+    if audio_format in CONCATENABLE_FORMATS:
+        return b"".join(segments)
+
+    # Container formats (Ogg Opus, FLAC) need remuxing
+    with tempfile.TemporaryDirectory() as temp_dir:
+        list_path = os.path.join(temp_dir, "segments.txt")
+        with open(list_path, "w") as list_file:
+            for index, segment in enumerate(segments):
+                segment_path = os.path.join(temp_dir, f"segment_{index}.{audio_format}")
+                with open(segment_path, "wb") as f:
+                    f.write(segment)
+                list_file.write(f"file '{segment_path}'\n")
+
+        output_path = os.path.join(temp_dir, f"joined.{audio_format}")
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", output_path],
+            check=True,
+            capture_output=True,
+        )
+        with open(output_path, "rb") as f:
+            return f.read()
+
+
+def generate_summary_with_audio(
+    content: str,
+    title: str,
+    publish_date: str,
+    summary_type: str = "quick",
+    output_dir: str = "audio_files",
+    sections: list | None = None,
+    settings: dict | None = None,
+    deadline=None,
+    on_text=None,
+) -> tuple:
+    """
+    Generate the summary and its audio with the two overlapped.
+
+    The summary is streamed; complete sentences are batched into segments and
+    synthesized on a thread pool while the model is still writing, and the
+    segments are joined in order into one audio file. End-to-end time is close
+    to the longer of the two stages instead of their sum.
+
+    Returns (summary_data, audio_data); audio_data is None if the summary failed.
+    """
+    settings = normalize_audio_settings(settings)
+    audio_format = settings["format"]
+
+    if audio_format not in CONCATENABLE_FORMATS and not shutil.which("ffmpeg"):
+        # Segments could not be joined, so synthesize the summary in one call
+        logger.info(f"ffmpeg not found, synthesizing {audio_format} audio after the summary")
+        summary_data = generate_summary(
+            content, title, publish_date, summary_type,
+            sections=sections, deadline=deadline, on_text=on_text,
+        )
+        if "error" in summary_data:
+            return summary_data, None
+        audio_data = generate_audio(
+            summary_data["summary"], title, output_dir, settings=settings, deadline=deadline
+        )
+        return summary_data, audio_data
+
+    executor = ThreadPoolExecutor(max_workers=TTS_PIPELINE_WORKERS)
+    batcher = SentenceBatcher()
+    futures = []
+    streamed = []
+    summary_data = None
+
+    def synthesize(segment):
+        futures.append(executor.submit(synthesize_speech, segment, settings, deadline))
+
+    def handle_text(text):
+        streamed.append(text)
+        if on_text:
+            on_text(text)
+        for segment in batcher.feed(text):
+            synthesize(segment)
+
+    try:
+        summary_data = generate_summary(
+            content, title, publish_date, summary_type,
+            sections=sections, deadline=deadline, on_text=handle_text,
+        )
+        if "error" in summary_data:
+            return summary_data, None
+
+        if "".join(streamed) != summary_data["summary"]:
+            # The streamed text could not be decoded reliably, start over from the final summary
+            logger.warning("Streamed summary differs from the final summary, re-segmenting")
+            for future in futures:
+                future.cancel()
+            futures = []
+            batcher = SentenceBatcher()
+            for segment in batcher.feed(summary_data["summary"]):
+                synthesize(segment)
+
+        for segment in batcher.flush():
+            synthesize(segment)
+
+        logger.info(f"Waiting for {len(futures)} audio segments")
+        segments = [
+            future.result(timeout=request_timeout(deadline, stage="tts")) for future in futures
+        ]
+        audio_data = save_audio(concatenate_audio(segments, audio_format), title, output_dir, settings)
+        return summary_data, audio_data
+
+    except Exception as e:
+        logger.error(f"Error generating audio: {str(e)}")
+        if summary_data is None:
+            return {"error": f"Failed to generate summary: {str(e)}"}, None
+        return summary_data, {"error": f"Failed to generate audio: {str(e)}"}
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
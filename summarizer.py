@@ -1,9 +1,18 @@
 import json
 import os
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from model_router import routed_completion
+from output_budgets import output_budgets
+from text_segmenter import approximate_token_count, truncate_text
+
 # Load environment variables
 load_dotenv()
 
@@ -14,6 +23,17 @@ logger = logging.getLogger(__name__)
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Per-section notes and merged summaries, keyed by section fingerprints, so a
+# page that changed slightly only re-runs the sections that changed
+SECTION_CACHE_SIZE = 2048
+SECTION_WORKERS = 4
+# Shorter content is summarized directly: the extra section-notes calls would
+# only add latency to pages that gain little from incremental refreshes
+SECTIONED_SUMMARY_MIN_CHARS = 12000
+_section_notes = OrderedDict()
+_merged_summaries = OrderedDict()
+_section_cache_lock = threading.Lock()
+
 quick_summary_system_prompt = """You are an advanced web content extraction/creator AI with deep expertise in intelligent content analysis. Your mission is to generate a comprehensive, multi-dimensional summary that captures the nuanced essence of the article or video.
 
 ### Comprehensive Extraction Objectives
@@ -186,33 +206,207 @@ Expected JSON Response Format:
 """
 
 
-def truncate_content(content, max_tokens=8000):
-    """Truncate content to fit within token limits for OpenAI API"""
-    # This is a simple approximation - 1 token is roughly 4 chars in English
-    words = content.split()
-    approx_tokens = len(content) / 4
+section_notes_system_prompt = """
+You are preparing notes for one section of a longer article, blog post or video transcript. The notes will later be merged with the notes of the other sections into a final summary.
+
+Instructions:
+1. Capture every key fact, argument, figure, principle and lesson in the section.
+2. Keep the most striking quotes verbatim.
+3. Be concise: use short MARKDOWN bullet points and do not add commentary.
+
+Expected JSON Response Format:
+{
+  "response": {
+    "notes": "<Section notes in MARKDOWN format>"
+  }
+}
+"""
 
-    if approx_tokens <= max_tokens:
-        return content
 
-    # Calculate rough ratio to keep
-    keep_ratio = max_tokens / approx_tokens
-    keep_words = int(len(words) * keep_ratio)
+def _cache_get(cache, key):
+    with _section_cache_lock:
+        if key not in cache:
+            return None
+        cache.move_to_end(key)
+        return cache[key]
+
+
+def _cache_put(cache, key, value):
+    with _section_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > SECTION_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def generate_section_notes(section_text: str, title: str, deadline=None) -> str:
+    """Condense one section of the content into notes for the merge step"""
+    user_prompt = f"""
+# Here is the section to take notes on :
+
+Title: {title}
+Section: {section_text}
+"""
+    response, _ = routed_completion(
+        client,
+        "section_notes",
+        user_prompt,
+        deadline=deadline,
+        messages=[
+            {"role": "system", "content": section_notes_system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+    )
+    return json.loads(response.choices[0].message.content)["response"]["notes"]
+
+
+def uses_section_notes(content: str, sections: list | None) -> bool:
+    """Whether generate_summary summarizes this content through per-section notes"""
+    return bool(sections) and len(sections) > 1 and len(content) >= SECTIONED_SUMMARY_MIN_CHARS
+
+
+def uncached_sections(content: str, sections: list) -> list:
+    """The sections whose notes are not cached yet (generate_summary would call the model for them)"""
+    if not uses_section_notes(content, sections):
+        return []
+    with _section_cache_lock:
+        return [section for section in sections if section["hash"] not in _section_notes]
+
+
+def summarize_sections(content: str, title: str, sections: list, deadline=None) -> str:
+    """
+    Turn the content into merged section notes, reusing the cached notes of
+    sections whose fingerprint has been seen before.
+    """
+    notes = [_cache_get(_section_notes, section["hash"]) for section in sections]
+    missing = [index for index, note in enumerate(notes) if note is None]
+    logger.info(f"Re-summarizing {len(missing)} of {len(sections)} sections")
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=SECTION_WORKERS) as executor:
+            generated = executor.map(
+                lambda index: generate_section_notes(
+                    content[sections[index]["start"] : sections[index]["end"]], title, deadline
+                ),
+                missing,
+            )
+            for index, note in zip(missing, generated):
+                _cache_put(_section_notes, sections[index]["hash"], note)
+                notes[index] = note
+
+    return "\n\n".join(
+        f"## Section {index + 1}\n{note}" for index, note in enumerate(notes)
+    )
+
+
+class JsonStringFieldDecoder:
+    """
+    Incrementally decodes one string field (e.g. "summary") out of a JSON
+    object that arrives in chunks, so the text can be used before the whole
+    response has been generated.
+    """
+
+    def __init__(self, field):
+        self._start_regex = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._position = None  # index of the first undecoded character of the value
+        self.done = False
+
+    def _safe_end(self):
+        """Index up to which the raw value can be decoded without splitting an escape"""
+        index = self._position
+        while index < len(self._buffer):
+            char = self._buffer[index]
+            if char == '"':
+                self.done = True
+                return index
+            if char != "\\":
+                index += 1
+                continue
+            if index + 1 >= len(self._buffer):
+                return index
+            if self._buffer[index + 1] != "u":
+                index += 2
+                continue
+            # \uXXXX, plus its low surrogate if this is a high surrogate
+            if index + 6 > len(self._buffer):
+                return index
+            length = 6
+            if 0xD800 <= int(self._buffer[index + 2 : index + 6], 16) <= 0xDBFF:
+                if index + 12 > len(self._buffer):
+                    return index
+                length = 12
+            index += length
+        return index
+
+    def feed(self, chunk):
+        """Add raw response text and return any newly decoded field text"""
+        if self.done:
+            return ""
+        self._buffer += chunk
+
+        if self._position is None:
+            match = self._start_regex.search(self._buffer)
+            if not match:
+                return ""
+            self._position = match.end()
+
+        end = self._safe_end()
+        decoded = json.loads(f'"{self._buffer[self._position:end]}"')
+        self._position = end
+        return decoded
+
+
+def truncate_content(content, max_tokens=8000, token_counter=None):
+    """Truncate content to fit within token limits for OpenAI API"""
+    truncated, was_truncated = truncate_text(content, max_tokens, token_counter)
+    if not was_truncated:
+        return content
 
     # Return truncated content with note
-    truncated = " ".join(words[:keep_words])
     return truncated + "\n\n[Note: Content was truncated due to length limitations]"
 
 
 def generate_summary(
-    content: str, title: str, publish_date: str, summary_type: str = "quick"
+    content: str,
+    title: str,
+    publish_date: str,
+    summary_type: str = "quick",
+    sections: list | None = None,
+    deadline=None,
+    on_text=None,
 ) -> dict:
-    """Generate a summary using OpenAI's API based on the selected summary type"""
+    """
+    Generate a summary using OpenAI's API based on the selected summary type.
+
+    When the content is long (SECTIONED_SUMMARY_MIN_CHARS or more) and has
+    more than one fingerprinted section (see
+    content_extractor.fingerprint_sections), each section is condensed into
+    cached notes and only the notes are summarized, so a refresh of a changed
+    page only re-runs the sections that changed.
+
+    Model calls are abandoned once the optional deadline passes. If on_text
+    is given, the response is streamed and on_text is called with each new
+    piece of summary text as soon as it is generated.
+
+    Output length is capped by the summary type's token budget (see
+    output_budgets), and each completion's length and latency are recorded
+    so the budget can follow the type's latency SLO.
+    """
     if not content:
         return {"error": "No content provided for summarization"}
 
-    # Truncate content if needed
-    truncated_content = truncate_content(content, max_tokens=120000)
+    merge_key = None
+    if uses_section_notes(content, sections):
+        merge_key = (summary_type, title, publish_date, tuple(s["hash"] for s in sections))
+        cached_summary = _cache_get(_merged_summaries, merge_key)
+        if cached_summary is not None:
+            logger.info("Content unchanged, reusing cached summary")
+            if on_text:
+                on_text(cached_summary["summary"])
+            return dict(cached_summary)
 
     # Define prompts for different summary types
     prompts = {
@@ -225,6 +419,16 @@ def generate_summary(
     if summary_type not in prompts:
         return {"error": f"Invalid summary type: {summary_type}"}
 
+    if merge_key:
+        try:
+            content = summarize_sections(content, title, sections, deadline=deadline)
+        except Exception as e:
+            logger.error(f"Error generating section notes: {str(e)}")
+            return {"error": f"Failed to generate summary: {str(e)}"}
+
+    # Truncate content if needed
+    truncated_content = truncate_content(content, max_tokens=120000)
+
     user_prompt = """
 # Here is the content to summarize :
 
@@ -240,37 +444,95 @@ Published Date: {variable_publish_date}
     )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        started = time.monotonic()
+        response, model = routed_completion(
+            client,
+            summary_type,
+            user_prompt,
+            deadline=deadline,
             messages=[
                 {
                     "role": "system",
-                    "content": prompts[summary_type],
+                    "content": prompts[summary_type] + output_budgets.length_instruction(summary_type),
                 },
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.5,
+            max_tokens=output_budgets.max_tokens(summary_type),
             response_format={"type": "json_object"},
+            stream=bool(on_text),
         )
 
-        response_text = response.choices[0].message.content
-
-        json_response = json.loads(response_text)
-        summary = json_response["response"]["summary"]
-        published_date = json_response["response"]["published_date"]
+        if on_text:
+            decoder = JsonStringFieldDecoder("summary")
+            parts = []
+            finish_reason = None
+            try:
+                for chunk in response:
+                    if deadline:
+                        deadline.check("summary")
+                    if chunk.choices and chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    parts.append(chunk.choices[0].delta.content)
+                    text = decoder.feed(chunk.choices[0].delta.content)
+                    if text:
+                        on_text(text)
+            finally:
+                # Records the call in the model's stats, also when it is abandoned
+                response.close()
+            response_text = "".join(parts)
+            # Streamed responses carry no usage, so the length is estimated
+            completion_tokens = approximate_token_count(response_text)
+        else:
+            response_text = response.choices[0].message.content
+            finish_reason = response.choices[0].finish_reason
+            completion_tokens = response.usage.completion_tokens
+
+        truncated = finish_reason == "length"
+        output_budgets.record(
+            summary_type,
+            time.monotonic() - started,
+            completion_tokens,
+            truncated=truncated,
+            estimated=bool(on_text),
+        )
 
-        return {
+        try:
+            json_response = json.loads(response_text)
+            summary = json_response["response"]["summary"]
+            published_date = json_response["response"]["published_date"]
+        except json.JSONDecodeError:
+            if not truncated:
+                raise
+            # The budget cut the JSON short, keep the summary text written so far
+            logger.warning(f"{summary_type} summary hit its output budget, using the partial summary")
+            summary = JsonStringFieldDecoder("summary").feed(response_text)
+            published_date = publish_date
+            if not summary:
+                raise
+
+        summary_data = {
             "summary": summary,
             "summary_type": summary_type,
             "published_date": published_date,
+            "model": model,
         }
+        if truncated:
+            summary_data["truncated"] = True
+        if merge_key:
+            _cache_put(_merged_summaries, merge_key, summary_data)
+        return summary_data
 
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         return {"error": f"Failed to generate summary: {str(e)}"}
 
 
-def generate_audio_summary(content: str, title: str, summary_type: str) -> str | None:
+def generate_audio_summary(
+    content: str, title: str, summary_type: str, deadline=None
+) -> str | None:
     """
     Generate a summary of the content in audio format
     """
@@ -292,8 +554,11 @@ Summary Type : {variable_summary_type}
     )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # or "gpt-3.5-turbo" for lower cost
+        response, _ = routed_completion(
+            client,
+            "audio_summary",
+            user_prompt,
+            deadline=deadline,
             messages=[
                 {
                     "role": "system",
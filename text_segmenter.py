@@ -0,0 +1,226 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # exact token counts are optional
+    tiktoken = None
+
+# Words that end with a period without ending the sentence
+ABBREVIATIONS = frozenset(
+    {
+        "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+        "inc", "ltd", "co", "corp", "dept", "fig", "no", "vol", "approx", "est",
+        "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+        "u.s", "u.k", "a.m", "p.m", "ph.d",
+    }
+)
+
+# Candidate sentence ends: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or a line break. Starting with a single character
+# class lets the regex engine skip ahead quickly between candidates.
+SENTENCE_END_REGEX = re.compile(r"[.!?…\n](?:(?<=\n)\n*|[.!?…]*[\"'”’)\]]*(?=\s))")
+WORD_BEFORE_REGEX = re.compile(r"([\w.]+)$")
+
+# Longer "sentences" (e.g. auto-generated transcripts without punctuation)
+# are cut at whitespace into pseudo-sentences of at most this size
+MAX_SENTENCE_CHARS = 400
+
+# How far back from a character budget to look for the last sentence end
+BOUNDARY_SEARCH_CHARS = 2 * MAX_SENTENCE_CHARS
+
+# Characters per token used when no token counter is available
+CHARS_PER_TOKEN = 4
+
+
+def approximate_token_count(text):
+    """Rough token count - 1 token is roughly 4 chars in English (rounded up, so counts of parts add up)"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def get_token_counter(model="gpt-4o"):
+    """
+    Return a function counting tokens for a model: exact with tiktoken when it
+    is installed, otherwise the character-based approximation.
+    """
+    if tiktoken is None:
+        return approximate_token_count
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _is_sentence_end(text, match):
+    """Reject periods after abbreviations and initials, and before lowercase words"""
+    if match.group().startswith("\n") or text[match.start()] != ".":
+        return True
+
+    word = WORD_BEFORE_REGEX.search(text, max(0, match.start() - 12), match.start())
+    if word:
+        token = word.group(1).lower()
+        if token in ABBREVIATIONS or (len(token) == 1 and token.isalpha()):
+            return False
+
+    next_start = match.end()
+    while next_start < len(text) and text[next_start].isspace():
+        next_start += 1
+    return next_start >= len(text) or not text[next_start].islower()
+
+
+def _split_long_span(text, start, end, max_chars):
+    """Cut a span at whitespace into pieces of at most max_chars"""
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        yield start, cut
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        yield start, end
+
+
+def sentence_boundaries(text, start=0, end=None):
+    """
+    Yield the offsets in text[start:end] just past each sentence end.
+    A sentence end needs whitespace after it, so text that is still
+    being streamed is never cut inside a number or an abbreviation.
+    """
+    for match in SENTENCE_END_REGEX.finditer(text, start, len(text) if end is None else end):
+        if _is_sentence_end(text, match):
+            yield match.end()
+
+
+def sentence_spans(text, start=0, end=None):
+    """
+    Yield (start, end) spans of the sentences in text[start:end], in one pass.
+
+    Abbreviations, initials and decimals do not end a sentence; runs without
+    any punctuation are cut into pseudo-sentences at whitespace.
+    """
+    end = len(text) if end is None else end
+    sentence_start = start
+
+    for sentence_end in sentence_boundaries(text, start, end):
+        if sentence_end > sentence_start:
+            yield from _split_long_span(text, sentence_start, sentence_end, MAX_SENTENCE_CHARS)
+        sentence_start = sentence_end
+        while sentence_start < end and text[sentence_start].isspace():
+            sentence_start += 1
+
+    if end > sentence_start:
+        yield from _split_long_span(text, sentence_start, end, MAX_SENTENCE_CHARS)
+
+
+def last_boundary_before(text, start, limit):
+    """
+    Offset at which to cut text[start:] so it ends by limit: after the last
+    sentence end near the limit, else at the last space, else at the limit.
+    """
+    boundary = None
+    for boundary in sentence_boundaries(text, max(start + 1, limit - BOUNDARY_SEARCH_CHARS), limit):
+        pass
+    if boundary is None:
+        boundary = text.rfind(" ", start + 1, limit)
+    return boundary if boundary > start else limit
+
+
+def _chunk_spans_by_chars(text, max_chars, start, end):
+    """chunk_spans for character budgets: jump to each limit and look back for a boundary"""
+    chunks = []
+    while end - start > max_chars:
+        cut = last_boundary_before(text, start, start + max_chars)
+        chunks.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        chunks.append((start, end))
+    return chunks
+
+
+def split_sentences(text):
+    """Split text into sentences"""
+    return [text[start:end].strip() for start, end in sentence_spans(text)]
+
+
+def chunk_spans(text, max_size, measure=len, start=0, end=None):
+    """
+    Group consecutive sentences of text[start:end] into (start, end) spans whose
+    size, as given by measure (len for characters or a token counter), stays
+    within max_size. A sentence that is too large on its own is split at
+    whitespace. Runs in linear time; chunks are slices of the original text.
+    """
+    end = len(text) if end is None else end
+    if measure is len or measure is approximate_token_count:
+        max_chars = max_size if measure is len else max_size * CHARS_PER_TOKEN
+        return _chunk_spans_by_chars(text, max_chars, start, end)
+
+    chunks = []
+    chunk_start = chunk_end = None
+    chunk_size = 0
+
+    for span_start, span_end in sentence_spans(text, start, end):
+        if chunk_start is not None:
+            # Measured from the end of the chunk so the whitespace in between counts too
+            size = measure(text[chunk_end:span_end])
+            if chunk_size + size <= max_size:
+                chunk_end = span_end
+                chunk_size += size
+                continue
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = None
+
+        size = measure(text[span_start:span_end])
+        if size > max_size:
+            # Hard split, sized by the sentence's own characters per unit
+            piece_chars = max(1, int(max_size * (span_end - span_start) / size))
+            chunks.extend(_split_long_span(text, span_start, span_end, piece_chars))
+            continue
+
+        chunk_start, chunk_end, chunk_size = span_start, span_end, size
+
+    if chunk_start is not None:
+        chunks.append((chunk_start, chunk_end))
+    return chunks
+
+
+def chunk_text(text, max_chars=None, max_tokens=None, token_counter=None):
+    """
+    Split text into chunks at sentence boundaries, budgeted by characters
+    (max_chars) or by tokens (max_tokens, counted with token_counter).
+    """
+    if max_tokens is not None:
+        measure = token_counter or approximate_token_count
+        max_size = max_tokens
+    else:
+        measure = len
+        max_size = max_chars
+
+    if measure(text) <= max_size:
+        return [text] if text.strip() else []
+    return [text[start:end] for start, end in chunk_spans(text, max_size, measure)]
+
+
+def truncate_text(text, max_tokens, token_counter=None):
+    """
+    Keep the leading sentences of text that fit within max_tokens.
+    Returns the (possibly shortened) text and whether anything was cut.
+    """
+    count = token_counter or approximate_token_count
+    if count(text) <= max_tokens:
+        return text, False
+    if count is approximate_token_count:
+        return text[: last_boundary_before(text, 0, max_tokens * CHARS_PER_TOKEN)], True
+
+    used = 0
+    cut = 0
+    for start, end in sentence_spans(text):
+        size = count(text[start:end])
+        if used + size > max_tokens:
+            break
+        used += size
+        cut = end
+    return text[:cut], True
@@ -0,0 +1,168 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+YOUTUBE_HOST_REGEX = re.compile(
+    r"^(?:www\.|m\.|music\.)?(?:youtube\.com|youtube-nocookie\.com|youtu\.be)$"
+)
+YOUTUBE_VIDEO_ID_REGEX = re.compile(r"^[A-Za-z0-9_-]{11}$")
+YOUTUBE_VIDEO_PATH_REGEX = re.compile(r"^/(?:embed|v|e|shorts|live)/([^/?#&]+)")
+YOUTUBE_CHANNEL_PATH_REGEX = re.compile(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)")
+TRACKING_PARAM_REGEX = re.compile(
+    r"^(?:utm_\w+|fbclid|gclid|dclid|msclkid|yclid|igshid|mc_cid|mc_eid|_ga|_gl"
+    r"|ref|ref_src|ref_url|spm|si|feature|cmpid|ocid|s_cid|wt\.mc_id)$",
+    re.IGNORECASE,
+)
+
+# Hosts that only redirect somewhere else; their targets are resolved up front
+SHORTENER_HOSTS = frozenset(
+    {"bit.ly", "t.co", "tinyurl.com", "ow.ly", "buff.ly", "lnkd.in", "goo.gl", "rebrand.ly", "trib.al"}
+)
+
+REDIRECT_CACHE_SIZE = 4096
+_redirects = OrderedDict()
+_redirects_lock = threading.Lock()
+
+
+def _parse(url):
+    url = url.strip()
+    return urlparse(url if "://" in url else f"https://{url}")
+
+
+def _host(parsed_url):
+    return (parsed_url.hostname or "").lower()
+
+
+def is_youtube_host(url):
+    """Check if the URL is served by YouTube"""
+    return bool(YOUTUBE_HOST_REGEX.match(_host(_parse(url))))
+
+
+def extract_youtube_video_id(url):
+    """
+    Extract the YouTube video ID from any URL shape: watch?v=, youtu.be/ID,
+    /embed/, /v/, /shorts/ and /live/, with or without extra query parameters.
+    """
+    parsed_url = _parse(url)
+    host = _host(parsed_url)
+    if not YOUTUBE_HOST_REGEX.match(host):
+        return None
+
+    if host.endswith("youtu.be"):
+        video_id = parsed_url.path.lstrip("/").split("/")[0]
+    else:
+        match = YOUTUBE_VIDEO_PATH_REGEX.match(parsed_url.path)
+        if match:
+            video_id = match.group(1)
+        else:
+            video_id = dict(parse_qsl(parsed_url.query)).get("v", "")
+
+    return video_id if YOUTUBE_VIDEO_ID_REGEX.match(video_id) else None
+
+
+def extract_youtube_playlist_id(url):
+    """Extract the playlist ID from a YouTube playlist URL"""
+    parsed_url = _parse(url)
+    if not YOUTUBE_HOST_REGEX.match(_host(parsed_url)):
+        return None
+    return dict(parse_qsl(parsed_url.query)).get("list") or None
+
+
+def is_youtube_playlist_url(url):
+    """Check if the URL points to a YouTube playlist rather than a single video"""
+    parsed_url = _parse(url)
+    return (
+        bool(YOUTUBE_HOST_REGEX.match(_host(parsed_url)))
+        and parsed_url.path == "/playlist"
+        and extract_youtube_playlist_id(url) is not None
+    )
+
+
+def is_youtube_channel_url(url):
+    """Check if the URL points to a YouTube channel"""
+    parsed_url = _parse(url)
+    return bool(YOUTUBE_HOST_REGEX.match(_host(parsed_url))) and bool(
+        YOUTUBE_CHANNEL_PATH_REGEX.match(parsed_url.path)
+    )
+
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so that every spelling of the same resource maps to one key.
+
+    YouTube videos and playlists become their canonical watch/playlist URL.
+    Other URLs get a lowercase https scheme and host without "www.", no
+    default port, fragment, tracking parameters or trailing slash, and sorted
+    query parameters.
+    """
+    video_id = extract_youtube_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    if is_youtube_playlist_url(url):
+        return f"https://www.youtube.com/playlist?list={extract_youtube_playlist_id(url)}"
+
+    parsed_url = _parse(url)
+    host = _host(parsed_url)
+    if host.startswith("www."):
+        host = host[4:]
+    if parsed_url.port and parsed_url.port not in (80, 443):
+        host = f"{host}:{parsed_url.port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parsed_url.query, keep_blank_values=True)
+        if not TRACKING_PARAM_REGEX.match(key)
+    )
+    path = re.sub(r"/{2,}", "/", parsed_url.path).rstrip("/")
+
+    return urlunparse(("https", host, path, "", urlencode(query), ""))
+
+
+def remember_redirect(url, final_url):
+    """Record where a URL redirected to (e.g. from a fetch that followed redirects)"""
+    source = canonicalize_url(url)
+    target = canonicalize_url(final_url)
+    with _redirects_lock:
+        _redirects[source] = target
+        _redirects.move_to_end(source)
+        while len(_redirects) > REDIRECT_CACHE_SIZE:
+            _redirects.popitem(last=False)
+    return target
+
+
+def resolve_redirects(url, timeout=10):
+    """
+    Return the canonical URL a link finally points to.
+
+    Redirects learned from earlier fetches are served from the cache. Known
+    link shorteners are resolved with a HEAD request; other URLs are assumed
+    to be final, since their fetch records any redirect it followed.
+    """
+    canonical_url = canonicalize_url(url)
+    with _redirects_lock:
+        if canonical_url in _redirects:
+            _redirects.move_to_end(canonical_url)
+            return _redirects[canonical_url]
+
+    if _host(_parse(url)) not in SHORTENER_HOSTS:
+        return canonical_url
+
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=timeout)
+        return remember_redirect(url, response.url)
+    except Exception as e:
+        logger.error(f"Error resolving redirects for {url}: {str(e)}")
+        return canonical_url
+
+
+def cache_key(url):
+    """The key under which all caches in the pipeline store results for a URL"""
+    return resolve_redirects(url)